@@ -1,19 +1,117 @@
 import random
-random.seed(7331)
+import numpy as np
+from array import array
+from collections import OrderedDict, deque
+from itertools import islice
+from concurrent.futures import ProcessPoolExecutor
 
+from meshes.maze2d import NORTH, EAST, SOUTH, WEST, ABOVE, BELOW, LINKS_2D, as_random
+from meshes.cube import Cube
+from meshes.grid_edges import grid_edges, neighbor_table, link_bits_to, is_stacked, rewired_neighbors
 
-def growing_tree(grid, choose_active=None, find_available_neighbors=None, choose_neighbor=None, start=None):
+
+# Set of active cell ids for the growing tree algorithm.
+#   Cells are kept in insertion order (for newest/oldest selection) and in dense
+#   per-level buckets (for random selection), so adding, removing and picking a
+#   cell are all O(1).
+class ActiveSet:
+    def __init__(self, rng=random):
+        self.rng = rng
+        self.order = OrderedDict()
+        self.items = []
+        self.index = {}
+        self.buckets = {}
+        self.bucket_index = {}
+
+    def __len__(self):
+        return len(self.items)
+
+    def __contains__(self, id):
+        return id in self.index
+
+    def __iter__(self):
+        return iter(self.order)
+
+    # Indexes in insertion order, like the list this replaced: active[-1] is the newest cell
+    def __getitem__(self, i):
+        n = len(self.order)
+        if i < 0:
+            i += n
+        if i < 0 or i >= n:
+            raise IndexError('active set index out of range')
+        if i == n - 1:
+            return self.newest()
+        if i == 0:
+            return self.oldest()
+        if i < n // 2:
+            return next(islice(self.order, i, None))
+        return next(islice(reversed(self.order), n - 1 - i, None))
+
+    def add(self, id, level=None):
+        if id in self.index:
+            return
+        self.order[id] = level
+        self.index[id] = len(self.items)
+        self.items.append(id)
+        bucket = self.buckets.setdefault(level, [])
+        self.bucket_index[id] = len(bucket)
+        bucket.append(id)
+
+    def remove(self, id):
+        level = self.order.pop(id)
+        swap_remove(self.items, self.index, id)
+        swap_remove(self.buckets[level], self.bucket_index, id)
+
+    def count(self, level):
+        return len(self.buckets.get(level, ()))
+
+    def newest(self):
+        return next(reversed(self.order))
+
+    def oldest(self):
+        return next(iter(self.order))
+
+    def random(self):
+        return self.rng.choice(self.items)
+
+    def random_on_level(self, level):
+        return self.rng.choice(self.buckets[level])
+
+
+# Removes `id` from `items` by moving the last item into its place
+def swap_remove(items, index, id):
+    i = index.pop(id)
+    last = items.pop()
+    if last != id:
+        items[i] = last
+        index[last] = i
+
+
+# Mazes are generated with `grid.rng`.  Passing `rng` (see `as_random()`) replaces it.
+#
+# The built in strategies (any of the choose_active_* functions with the default neighbor
+#   functions) run in `growing_tree_fast()`, which makes the same maze without calling
+#   back for every step.  Use `fast=False` to always use the callbacks.
+def growing_tree(grid, choose_active=None, find_available_neighbors=None, choose_neighbor=None, start=None, rng=None, fast=True):
+    if rng != None:
+        grid.rng = as_random(rng)
     if choose_active == None:
         choose_active = choose_active_random_cell
     if start == None:
         start = grid.random_cell()
+    strategy = fast_strategies.get(choose_active)
+    if hasattr(choose_active, 'ratio'):
+        strategy = 'mixed'
+    if fast and strategy != None and find_available_neighbors in (None, list_all_available_neighbors) \
+            and choose_neighbor in (None, choose_random_neighbor):
+        return growing_tree_fast(grid, strategy, start.id, getattr(choose_active, 'ratio', 0))
     if choose_neighbor == None:
         choose_neighbor = choose_random_neighbor
     if find_available_neighbors == None:
         find_available_neighbors = list_all_available_neighbors
     cell = start
-    active = []
-    active.append(cell.id)
+    active = ActiveSet(grid.rng)
+    active.add(cell.id, cell.level)
     iteration = 0
     while len(active) > 0:
         chosen = choose_active(grid, active, cell.level)
@@ -22,47 +120,460 @@ def growing_tree(grid, choose_active=None, find_available_neighbors=None, choose
         if len(available) > 0:
             neighbor = choose_neighbor(grid, cell, available, cell.level)
             grid.link(cell.id, neighbor)
-            active.append(neighbor)
+            active.add(neighbor, grid.lookup(neighbor).level)
         else:
             active.remove(cell.id)
         iteration += 1
 
 
-def growing_tree_3d(grid, find_available_neighbors=None):
+# Growing tree with the active cell strategy inlined ('random', 'newest', 'oldest' or
+#   'mixed' with `ratio`).  Neighbors are worked out from the cell id (with a small
+#   table for the rewired edges of grids like `Cylinder`), and available neighbors are
+#   gathered into fixed slots, so steps don't allocate and memory stays at a few bytes
+#   per cell.  Random numbers are drawn in the same order as `growing_tree()`, so both
+#   make the same maze.
+def growing_tree_fast(grid, strategy, start, ratio=0.5):
+    rows = grid.rows
+    cols = grid.cols
+    levels = getattr(grid, 'levels', 1)
+    cap2d = rows * cols
+    north_edge = cols
+    south_edge = cap2d - cols
+    above_edge = (levels - 1) * cap2d if is_stacked(grid) else -1
+    below_edge = cap2d if is_stacked(grid) else grid.cap
+    rewired = rewired_neighbors(grid)
+    link_bits = grid.link_bits
+    randrange = grid.rng.randrange
+    random = grid.rng.random
+    # available neighbors of the current cell, with the link bits to and from each one
+    found = [0] * 6
+    found_to = [0] * 6
+    found_back = [0] * 6
+
+    # random and mixed: dense items with their positions.  newest, oldest and mixed:
+    #   cells in the order they were added.
+    items = [start]
+    pos = array('i' if grid.cap < 2**31 else 'q', [0]) * grid.cap
+    order = deque([start]) if strategy == 'oldest' else OrderedDict([(start, None)])
+    stack = [start]
+    match strategy:
+        case 'newest': active = stack
+        case 'oldest': active = order
+        case _: active = items
+    while len(active) > 0:
+        match strategy:
+            case 'random':
+                cell = items[randrange(len(items))]
+            case 'newest':
+                cell = stack[-1]
+            case 'oldest':
+                cell = order[0]
+            case 'mixed':
+                if random() < ratio:
+                    cell = next(reversed(order))
+                else:
+                    cell = items[randrange(len(items))]
+
+        count = 0
+        entries = rewired.get(cell)
+        if entries == None:
+            i = cell % cap2d
+            col = i % cols
+            if i >= north_edge and link_bits[cell - cols] == 0:
+                found[count], found_to[count], found_back[count] = cell - cols, NORTH, SOUTH
+                count += 1
+            if col < cols - 1 and link_bits[cell + 1] == 0:
+                found[count], found_to[count], found_back[count] = cell + 1, EAST, WEST
+                count += 1
+            if i < south_edge and link_bits[cell + cols] == 0:
+                found[count], found_to[count], found_back[count] = cell + cols, SOUTH, NORTH
+                count += 1
+            if col > 0 and link_bits[cell - 1] == 0:
+                found[count], found_to[count], found_back[count] = cell - 1, WEST, EAST
+                count += 1
+            if cell < above_edge and link_bits[cell + cap2d] == 0:
+                found[count], found_to[count], found_back[count] = cell + cap2d, ABOVE, BELOW
+                count += 1
+            if cell >= below_edge and link_bits[cell - cap2d] == 0:
+                found[count], found_to[count], found_back[count] = cell - cap2d, BELOW, ABOVE
+                count += 1
+        else:
+            for n, to, back in entries:
+                if link_bits[n] == 0:
+                    found[count], found_to[count], found_back[count] = n, to, back
+                    count += 1
+        if count > 0:
+            k = randrange(count)
+            n = found[k]
+            link_bits[cell] |= found_to[k]
+            link_bits[n] |= found_back[k]
+            match strategy:
+                case 'newest':
+                    stack.append(n)
+                case 'oldest':
+                    order.append(n)
+                case _:
+                    pos[n] = len(items)
+                    items.append(n)
+                    if strategy == 'mixed':
+                        order[n] = None
+        else:
+            match strategy:
+                case 'newest':
+                    stack.pop()
+                case 'oldest':
+                    order.popleft()
+                case _:
+                    last = items.pop()
+                    if last != cell:
+                        items[pos[cell]] = last
+                        pos[last] = pos[cell]
+                    if strategy == 'mixed':
+                        del order[cell]
+
+
+# Carves each level of a cube as its own maze, then links every level to the one
+#   above it through a random cell.  Levels are independent, so they are carved
+#   across `workers` processes (all cores if None, or in this process if workers is 0).
+#   Every level gets its own seed from `grid.rng`, so the result doesn't depend on
+#   the number of workers.  `find_available_neighbors` must be picklable to use workers.
+def growing_tree_3d(grid, find_available_neighbors=None, rng=None, workers=0):
+    if rng != None:
+        grid.rng = as_random(rng)
     if find_available_neighbors == None:
         find_available_neighbors = list_same_level_available_neighbors
-    for i in range(grid.levels):
-        start = grid.random_cell_on_level(i)
-        growing_tree(
-            grid, find_available_neighbors=find_available_neighbors, start=start)
+    cap2d = grid.cap2d
+    jobs = [(grid.rows, grid.cols, grid.link_bits[i*cap2d:(i+1)*cap2d], grid.rng.getrandbits(64), find_available_neighbors)
+            for i in range(grid.levels)]
+    if workers == 0:
+        levels = list(map(carve_level, jobs))
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            levels = list(pool.map(carve_level, jobs))
+    for i, bits in enumerate(levels):
+        grid.link_bits[i*cap2d:(i+1)*cap2d] = bits
+    for i in range(grid.levels - 1):
         cell = grid.random_cell_on_level(i)
-        if cell.above:
-            grid.link(cell.id, cell.above)
+        grid.link(cell.id, cell.above)
+
+
+# Carves a single level, given as a slice of a cube's link bits, and returns its link bits
+def carve_level(job):
+    rows, cols, link_bits, seed, find_available_neighbors = job
+    level = Cube(rows=rows, cols=cols, levels=1, rng=seed)
+    level.link_bits[:] = link_bits
+    growing_tree(level, find_available_neighbors=find_available_neighbors)
+    return level.link_bits
+
+
+# Randomized Kruskal's algorithm.  Every edge of the grid is shuffled at once, then edges
+#   are linked in order whenever they join two different sets.  Works on any grid
+#   `grid_edges()` supports, including the wrapped edges of `Cylinder`, `Mobius` and
+#   `OuterCube` grids.
+def kruskal(grid, rng=None):
+    if rng != None:
+        grid.rng = as_random(rng)
+    a, b, bit_a, bit_b = grid_edges(grid)
+    order = np.random.default_rng(grid.rng.getrandbits(64)).permutation(len(a))
+    sets = DisjointSet(grid.cap)
+    union = sets.union
+    chosen = [i for i, x, y in zip(order.tolist(), a[order].tolist(), b[order].tolist())
+              if union(x, y)]
+    bits = np.frombuffer(grid.link_bits, dtype=np.uint8)
+    np.bitwise_or.at(bits, a[chosen], bit_a[chosen])
+    np.bitwise_or.at(bits, b[chosen], bit_b[chosen])
+
+
+# Wilson's algorithm, which picks uniformly from every possible maze on the grid.
+#   Loop-erased random walks are kept as a next pointer per cell, so revisiting a cell
+#   simply overwrites the loop.
+#
+# With `coverage` > 0 the maze is started with an Aldous-Broder walk until that
+#   fraction of the cells is in the maze, which avoids Wilson's slow start on large
+#   grids.  The result is then NOT uniform: stopping the walk early and growing the rest
+#   from its partial tree favours some mazes over others (on a 2x3 grid, coverage=0.5
+#   is far off uniform).  Use the default coverage=0, or `aldous_broder()`, for
+#   unbiased mazes.
+def wilson(grid, coverage=0.0, rng=None):
+    if rng != None:
+        grid.rng = as_random(rng)
+    random = grid.rng.random
+    neighbors = neighbor_table(grid)
+    width = neighbors.shape[1]
+    # Neighbors first, so a random neighbor of cell c is table[c*width + random() * degree[c]]
+    table = -np.sort(-neighbors, axis=1)
+    degree = (table >= 0).sum(axis=1).astype(np.uint8).tobytes()
+    flat = array('i' if table.dtype == np.int32 else 'q')
+    flat.frombytes(memoryview(np.ascontiguousarray(table)).cast('B'))
+    del table
+    cap = grid.cap
+    in_maze = bytearray(cap)
+    walk = array('q', bytes(8 * cap))
+    tree_a = array('q')
+    tree_b = array('q')
+
+    cell = grid.rng.randrange(cap)
+    in_maze[cell] = 1
+    count = 1
+    # Aldous-Broder
+    target = min(cap, coverage * cap)
+    while count < target:
+        neighbor = flat[cell*width + int(random() * degree[cell])]
+        if not in_maze[neighbor]:
+            in_maze[neighbor] = 1
+            count += 1
+            tree_a.append(cell)
+            tree_b.append(neighbor)
+        cell = neighbor
+    # Wilson
+    for start in range(cap):
+        if in_maze[start]:
+            continue
+        cell = start
+        while not in_maze[cell]:
+            neighbor = flat[cell*width + int(random() * degree[cell])]
+            walk[cell] = neighbor
+            cell = neighbor
+        cell = start
+        while not in_maze[cell]:
+            in_maze[cell] = 1
+            tree_a.append(cell)
+            tree_b.append(walk[cell])
+            cell = walk[cell]
+
+    a = np.frombuffer(tree_a, dtype=np.int64)
+    b = np.frombuffer(tree_b, dtype=np.int64)
+    bits = np.frombuffer(grid.link_bits, dtype=np.uint8)
+    np.bitwise_or.at(bits, a, link_bits_to(neighbors, a, b))
+    np.bitwise_or.at(bits, b, link_bits_to(neighbors, b, a))
+
+
+def aldous_broder(grid, rng=None):
+    wilson(grid, 1.0, rng)
+
+
+# Union-find over flat lists with path compression (halving) and union by rank
+class DisjointSet:
+    def __init__(self, size):
+        self.parent = list(range(size))
+        self.rank = [0] * size
+
+    def find(self, x):
+        parent = self.parent
+        while parent[x] != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
+
+    # Returns False if `x` and `y` were already in the same set
+    def union(self, x, y):
+        x = self.find(x)
+        y = self.find(y)
+        if x == y:
+            return False
+        rank = self.rank
+        if rank[x] < rank[y]:
+            x, y = y, x
+        self.parent[y] = x
+        if rank[x] == rank[y]:
+            rank[x] += 1
+        return True
 
 
 def choose_same_level_random_neighbor(grid, cell, available, level=None):
     choices = list(filter(lambda a: grid.lookup(a).level == level, available))
-    random.choice(choices)
+    grid.rng.choice(choices)
 
 
 def choose_active_random_cell(grid, active, level=None):
-    return random.choice(active)
+    return active.random()
 
 
 def choose_active_random_cell_same_level(grid, active, level=None):
-    if level:
-        return random.choice(list(filter(lambda n: grid.lookup(n).level == level, active)))
+    if level != None and active.count(level) > 0:
+        return active.random_on_level(level)
     else:
         return choose_active_random_cell(grid, active, level)
 
 
+# Recursive backtracker
+def choose_active_newest(grid, active, level=None):
+    return active.newest()
+
+
+# Prim-like
+def choose_active_oldest(grid, active, level=None):
+    return active.oldest()
+
+
+# Returns a chooser that picks the newest cell with a probability of `ratio` and a random cell otherwise
+def choose_active_mixed(ratio=0.5):
+    def choose_active(grid, active, level=None):
+        if grid.rng.random() < ratio:
+            return active.newest()
+        return active.random()
+    choose_active.ratio = ratio
+    return choose_active
+
+
+# Strategies `growing_tree_fast()` can run without callbacks
+fast_strategies = {
+    choose_active_random_cell: 'random',
+    choose_active_newest: 'newest',
+    choose_active_oldest: 'oldest',
+}
+
+
+# A neighbor is available if it has no links at all (including links above or below)
 def list_all_available_neighbors(grid, cell, level=None):
-    return list(filter(lambda n: not grid.lookup(n).has_links(), cell.neighbors()))
+    link_bits = grid.link_bits
+    return [n for n in cell.neighbors() if link_bits[n] == 0]
 
 
+# A cell's level is its id // cap2d, so neighbors are compared without making cells.
+#   Flat grids have no levels, so every neighbor is on the same level.
 def list_same_level_available_neighbors(grid, cell, level=None):
-    return list(filter(lambda n: grid.lookup(n).level == level and not grid.lookup(n).has_links(), cell.neighbors()))
+    link_bits = grid.link_bits
+    cap2d = getattr(grid, 'cap2d', None)
+    if cap2d == None:
+        return [n for n in cell.neighbors() if link_bits[n] & LINKS_2D == 0]
+    return [n for n in cell.neighbors() if link_bits[n] & LINKS_2D == 0 and n // cap2d == level]
 
 
 def choose_random_neighbor(grid, cell, available, level=None):
-    return random.choice(available)
+    return grid.rng.choice(available)
+
+
+# Eller's algorithm.  Mazes are generated one layer (a row, or a level of a cube) at a
+#   time, keeping only the sets of the current layer, and each finished layer is
+#   yielded as a bytearray of link bits (the same bits as `grid.link_bits`).
+#   Concatenating the layers gives the link bits of the whole grid.
+join_chance = 0.5
+down_chance = 0.3
+
+
+# Yields the rows of a `rows` by `cols` maze.  With `mobius` the last row is joined to
+#   the first row the way `Mobius` grids are, through `seams` passages (at least one).
+#   With `wrap` the last column is joined to the first, as in `Cylinder` grids.
+def eller_rows(rows, cols, rng=None, mobius=False, seams=1, wrap=False):
+    edges = [(c, c+1, EAST, WEST) for c in range(cols - 1)]
+    if wrap and cols == 2:
+        # both cells are east and west of each other
+        edges = [(0, 1, EAST | WEST, EAST | WEST)]
+    elif wrap and cols > 2:
+        edges.append((cols - 1, 0, EAST, WEST))
+    seam = None
+    if mobius:
+        seam = [(c, cols - 1 - c, NORTH, SOUTH) for c in range(cols)]
+    return eller_layers(rows, cols, edges, SOUTH, NORTH, as_random(rng), seam, seams)
+
+
+# Yields the levels of a cube maze, starting at level 0
+def eller_levels(rows, cols, levels, rng=None):
+    edges = [(i, i+1, EAST, WEST) for i in range(rows * cols) if i % cols != cols - 1] + \
+        [(i, i+cols, SOUTH, NORTH) for i in range(rows * cols - cols)]
+    return eller_layers(levels, rows * cols, edges, ABOVE, BELOW, as_random(rng))
+
+
+# Fills `grid.link_bits` using `eller_rows()` for RectGrid, Cylinder and Mobius grids,
+#   or `eller_levels()` for a Cube.  OuterCube faces join each other along every edge,
+#   which doesn't fit Eller's layers, so they aren't supported.
+def eller(grid, rng=None):
+    if rng != None:
+        grid.rng = as_random(rng)
+    match type(grid).__name__:
+        case 'Cube':
+            layers = eller_levels(grid.rows, grid.cols, grid.levels, grid.rng)
+        case 'RectGrid':
+            layers = eller_rows(grid.rows, grid.cols, grid.rng)
+        case 'Cylinder':
+            layers = eller_rows(grid.rows, grid.cols, grid.rng, wrap=True)
+        case 'Mobius':
+            layers = eller_rows(grid.rows, grid.cols, grid.rng, mobius=True)
+        case name:
+            raise TypeError(f"Eller's algorithm doesn't support {name} grids")
+    i = 0
+    for bits in layers:
+        grid.link_bits[i:i+len(bits)] = bits
+        i += len(bits)
+
+
+# `edges` are (a, b, bit_a, bit_b) links within a layer, and `down`/`up` are the bits
+#   that link a cell to the same cell in the next/previous layer.
+#
+# `seam` edges (first layer cell, last layer cell, bit_first, bit_last) join the last
+#   layer back to the first one.  Seam passages are opened in the first layer, and
+#   their sets are kept until the last layer so they can't close a loop.
+def eller_layers(layers, size, edges, down, up, rng, seam=None, seams=1):
+    edges = list(edges)
+    sets = [None] * size
+    next_set = 0
+    # last layer cell -> (set of the first layer cell it is joined to, link bit)
+    seam_sets = {}
+    incoming = bytearray(size)
+    for layer in range(layers):
+        last = layer == layers - 1
+        bits = incoming
+        incoming = bytearray(size)
+        parent = {}
+
+        for i in range(size):
+            if sets[i] == None:
+                sets[i] = next_set
+                next_set += 1
+        if layer == 0 and seam != None and layers > 1:
+            for i in rng.sample(range(len(seam)), min(max(seams, 1), len(seam))):
+                a, b, bit_a, bit_b = seam[i]
+                bits[a] |= bit_a
+                seam_sets[b] = (sets[a], bit_b)
+        if last:
+            for i, (s, bit) in seam_sets.items():
+                bits[i] |= bit
+
+        # Join neighboring cells in different sets, and every set in the last layer
+        rng.shuffle(edges)
+        for a, b, bit_a, bit_b in edges:
+            sa = find_set(parent, sets[a])
+            sb = find_set(parent, sets[b])
+            if sa != sb and (last or rng.random() < join_chance):
+                parent[sb] = sa
+                bits[a] |= bit_a
+                bits[b] |= bit_b
+        if last:
+            yield bits
+            return
+
+        # Every set continues into the next layer at least once.  Sets that reach the
+        #   last layer through a seam passage already do.
+        below = [None] * size
+        before_last = layer == layers - 2
+        groups = {}
+        for i in rng.sample(range(size), size):
+            groups.setdefault(find_set(parent, sets[i]), []).append(i)
+        for s, cells in groups.items():
+            for n, i in enumerate(cells):
+                if n > 0 and rng.random() >= down_chance:
+                    continue
+                if before_last and i in seam_sets:
+                    t = find_set(parent, seam_sets[i][0])
+                    if t == find_set(parent, s):
+                        continue
+                    parent[t] = find_set(parent, s)
+                bits[i] |= down
+                incoming[i] |= up
+                below[i] = s
+
+        # Only the sets still in use are kept, renamed to their roots
+        seam_sets = {i: (find_set(parent, s), bit)
+                     for i, (s, bit) in seam_sets.items()}
+        if before_last:
+            for i, (s, bit) in seam_sets.items():
+                below[i] = s
+        sets = [None if s == None else find_set(parent, s) for s in below]
+        yield bits
+
+
+def find_set(parent, s):
+    while parent.get(s, s) != s:
+        s = parent[s]
+    return s
@@ -0,0 +1,97 @@
+import random
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+import algos
+import metrics
+from meshes.cube import Cube
+from meshes.outer_cube import OuterCube, outer_cube_model
+from meshes.mobius import Mobius, mobius_maze_model_arrays
+from meshes.utils.export import export_mesh
+
+# Batch maze generation without Blender.
+#
+# A spec is a dict describing one maze:
+#   type        'cube', 'outer_cube' or 'mobius'
+#   rows, cols  grid size (and `levels` for cubes)
+#   seed        random seed; defaults to the spec's position in the batch
+#   inset       wall inset for cubes and outer cubes
+#   algorithm   active cell strategy for `growing_tree()`: 'random', 'newest',
+#               'oldest' or 'mixed' (with `ratio`, the chance of picking the newest cell)
+#   filename    optional; the mesh is written to this file (.obj, .ply or .stl)
+#               instead of being returned
+#   metrics     optional; if true the result includes `metrics.maze_metrics()`
+#   Mobius specs can also set major_radius, minor_radius, thick and height.
+#
+# Every maze is seeded from its own spec, so results don't depend on the number of
+#   workers or the order they finish in.
+
+defaults = {
+    'cube': {'rows': 6, 'cols': 6, 'levels': 6, 'inset': 0.15, 'show_outer_faces': False, 'clear': False},
+    'outer_cube': {'rows': 6, 'cols': 6, 'inset': 0.15, 'show_outer_faces': False},
+    'mobius': {'rows': 108, 'cols': 10, 'major_radius': 5, 'minor_radius': 2, 'thick': 0.1, 'height': 0.4},
+}
+
+
+# Generates every spec in `specs` across `workers` processes (all cores by default,
+#   or in this process if workers is 0).  Returns one result per spec, in order.
+def generate_batch(specs, workers=None, chunksize=1):
+    specs = [{'seed': i, **spec} for i, spec in enumerate(specs)]
+    if workers == 0:
+        return list(map(build_maze, specs))
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(build_maze, specs, chunksize=chunksize))
+
+
+def chooser(spec):
+    match spec.get('algorithm', 'random'):
+        case 'random': return algos.choose_active_random_cell
+        case 'newest': return algos.choose_active_newest
+        case 'oldest': return algos.choose_active_oldest
+        case 'mixed': return algos.choose_active_mixed(spec.get('ratio', 0.5))
+        case name: raise ValueError(f'Unknown algorithm: {name}')
+
+
+def new_grid(spec):
+    match spec['type']:
+        case 'cube': return Cube(rows=spec['rows'], cols=spec['cols'], levels=spec['levels'], inset=spec['inset'], clear=spec['clear'])
+        case 'outer_cube': return OuterCube(rows=spec['rows'], cols=spec['cols'])
+        case 'mobius': return Mobius(rows=spec['rows'], cols=spec['cols'])
+        case name: raise ValueError(f'Unknown maze type: {name}')
+
+
+def generate(grid, spec):
+    rng = random.Random(spec['seed'])
+    algos.growing_tree(grid, choose_active=chooser(spec), rng=rng)
+
+
+# Returns (verts, faces) as compact numpy arrays
+def maze_model(grid, spec):
+    match spec['type']:
+        case 'cube':
+            verts, faces = grid.generate_model_arrays(spec['show_outer_faces'])
+        case 'outer_cube':
+            verts, faces = outer_cube_model(grid, spec['show_outer_faces'], spec['inset'])
+        case 'mobius':
+            verts, faces = mobius_maze_model_arrays(grid, major_radius=spec['major_radius'], minor_radius=spec['minor_radius'],
+                                                    thick=spec['thick'], height=spec['height'])
+    return (np.asarray(verts, dtype=np.float32).reshape(-1, 3), np.asarray(faces, dtype=np.int32).reshape(-1, 4))
+
+
+# Generates and meshes a single maze.  Returns a dict with the spec and either the
+#   mesh (`verts` and `faces`) or the `filename` it was written to and its face count,
+#   plus `metrics` if the spec asks for them.
+def build_maze(spec):
+    spec = {**defaults.get(spec['type'], {}), **spec}
+    grid = new_grid(spec)
+    generate(grid, spec)
+    verts, faces = maze_model(grid, spec)
+    if spec.get('filename'):
+        count = export_mesh(spec['filename'], verts, faces)
+        result = {'spec': spec, 'filename': spec['filename'], 'faces': count}
+    else:
+        result = {'spec': spec, 'verts': verts, 'faces': faces}
+    if spec.get('metrics'):
+        result['metrics'] = metrics.maze_metrics(grid)
+    return result
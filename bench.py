@@ -0,0 +1,38 @@
+import sys
+import time
+
+import algos
+from meshes.cube import Cube
+
+# Times `growing_tree()` with callbacks against its fast path for each built in strategy.
+#   Both make the same maze from the same seed, which is checked as well.
+#
+#   python bench.py [size] [seed]
+
+strategies = {
+    'random': algos.choose_active_random_cell,
+    'newest': algos.choose_active_newest,
+    'oldest': algos.choose_active_oldest,
+    'mixed': algos.choose_active_mixed(0.5),
+}
+
+
+def time_growing_tree(size, choose_active, seed, fast):
+    grid = Cube(rows=size, cols=size, levels=size)
+    start = time.perf_counter()
+    algos.growing_tree(grid, choose_active=choose_active, rng=seed, fast=fast)
+    return (time.perf_counter() - start, grid.link_bits)
+
+
+def bench(size=50, seed=1):
+    print(f'growing_tree on Cube({size}, {size}, {size})')
+    print(f'{"strategy":<10}{"callbacks":>12}{"fast":>12}{"speedup":>10}')
+    for name, choose_active in strategies.items():
+        slow, slow_bits = time_growing_tree(size, choose_active, seed, False)
+        fast, fast_bits = time_growing_tree(size, choose_active, seed, True)
+        assert slow_bits == fast_bits, f'{name}: fast path made a different maze'
+        print(f'{name:<10}{slow:>11.2f}s{fast:>11.2f}s{slow / fast:>9.1f}x')
+
+
+if __name__ == '__main__':
+    bench(*map(int, sys.argv[1:3]))
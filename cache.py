@@ -0,0 +1,151 @@
+import hashlib
+import json
+import lzma
+import os
+import struct
+import tempfile
+import zipfile
+import zlib
+from collections import OrderedDict
+
+import numpy as np
+
+import batch
+from meshes.serialize import save_maze, load_maze
+
+# Cache of generated mazes and their meshes, keyed on a hash of the maze's spec (see
+#   batch.py; specs must have a seed).  Each entry is stored on disk as the serialized
+#   grid (`<key>.maze`) and its mesh (`<key>.npz`).  Entries are evicted least recently
+#   used first once the directory grows past `max_bytes`, and recent entries are also
+#   kept in memory.
+
+default_dir = os.environ.get('MAZE_CACHE_DIR', os.path.join(
+    os.path.expanduser('~'), '.cache', '3d_mazes'))
+version = 3
+
+
+class MazeCache:
+    def __init__(self, directory=default_dir, max_bytes=1 << 30, memo_size=32):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.memo_size = memo_size
+        self.memo = OrderedDict()
+        os.makedirs(directory, exist_ok=True)
+
+    # Returns (grid, verts, faces) for a spec, generating and storing it if needed
+    def build(self, spec):
+        spec = full_spec(spec)
+        key = spec_key(spec)
+        entry = self.get(key)
+        if entry == None:
+            grid = batch.new_grid(spec)
+            batch.generate(grid, spec)
+            verts, faces = batch.maze_model(grid, spec)
+            entry = (grid, verts, faces)
+            self.put(key, spec, entry)
+        return entry
+
+    def get(self, key):
+        entry = self.memo.get(key)
+        if entry != None:
+            self.memo.move_to_end(key)
+            return entry
+        maze_file, mesh_file = self.paths(key)
+        try:
+            grid, seed = load_maze(maze_file)
+            with np.load(mesh_file) as mesh:
+                entry = (grid, mesh['verts'], mesh['faces'])
+            os.utime(maze_file)
+            os.utime(mesh_file)
+        except FileNotFoundError:
+            return None
+        except (ValueError, KeyError, EOFError, OSError, zipfile.BadZipFile, struct.error, zlib.error, lzma.LZMAError):
+            # a truncated or corrupt entry is a miss, and is removed so it's built again
+            self.remove(key)
+            return None
+        self.remember(key, entry)
+        return entry
+
+    def put(self, key, spec, entry):
+        grid, verts, faces = entry
+        maze_file, mesh_file = self.paths(key)
+        tmp_files = []
+        try:
+            with tempfile.NamedTemporaryFile(dir=self.directory, suffix='.maze', delete=False) as f:
+                tmp_files.append(f.name)
+            save_maze(f.name, grid, spec['seed'])
+            with tempfile.NamedTemporaryFile(dir=self.directory, suffix='.npz', delete=False) as f:
+                tmp_files.append(f.name)
+                np.savez(f, verts=verts, faces=faces)
+            # the mesh goes last, so a grid without a mesh is never read as an entry
+            os.replace(tmp_files[0], maze_file)
+            os.replace(tmp_files[1], mesh_file)
+        finally:
+            # only left over if writing failed
+            for path in tmp_files:
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+        self.remember(key, entry)
+        self.evict()
+
+    def remember(self, key, entry):
+        self.memo[key] = entry
+        self.memo.move_to_end(key)
+        while len(self.memo) > self.memo_size:
+            self.memo.popitem(last=False)
+
+    def paths(self, key):
+        return (os.path.join(self.directory, key + '.maze'), os.path.join(self.directory, key + '.npz'))
+
+    # Removes the least recently used entries until the cache fits in `max_bytes`
+    def evict(self):
+        entries = {}
+        for f in os.scandir(self.directory):
+            key, ext = os.path.splitext(f.name)
+            if ext in ('.maze', '.npz') and f.is_file():
+                stat = f.stat()
+                size, used = entries.get(key, (0, 0))
+                entries[key] = (size + stat.st_size, max(used, stat.st_mtime))
+        total = sum(size for size, used in entries.values())
+        for key, (size, used) in sorted(entries.items(), key=lambda e: e[1][1]):
+            if total <= self.max_bytes:
+                break
+            self.remove(key)
+            total -= size
+
+    def remove(self, key):
+        for path in self.paths(key):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+        self.memo.pop(key, None)
+
+    def clear(self):
+        self.memo.clear()
+        for f in os.scandir(self.directory):
+            if os.path.splitext(f.name)[1] in ('.maze', '.npz'):
+                os.remove(f.path)
+
+
+# The spec with every default filled in, without options that don't change the maze
+def full_spec(spec):
+    if spec.get('seed') == None:
+        raise ValueError('Cached mazes need a seed')
+    spec = {**batch.defaults.get(spec['type'], {}), **spec}
+    for option in ('filename', 'metrics'):
+        spec.pop(option, None)
+    # same defaults as batch.chooser()
+    spec.setdefault('algorithm', 'random')
+    if spec['algorithm'] == 'mixed':
+        spec.setdefault('ratio', 0.5)
+    else:
+        spec.pop('ratio', None)
+    return spec
+
+
+def spec_key(spec):
+    data = json.dumps({'version': version, **spec}, sort_keys=True)
+    return hashlib.sha256(data.encode('utf-8')).hexdigest()
@@ -0,0 +1 @@
+# Lets tests import the top level modules (algos, solver, ...) however pytest is run
@@ -1,14 +1,41 @@
 import os
 import algos
+import cache as maze_cache
 
 from meshes.cube import Cube, create_cube
 from meshes.outer_cube import OuterCube, create_outer_cube
 from meshes.mobius import Mobius, create_mobius_strip
 
 
-def new_outer_cube(rows=6, cols=6, inset=0.15, inner_cube=False, save_image=False):
-    grid = OuterCube(rows=rows, cols=cols, clear=False)
-    algos.growing_tree(grid)
+# With an integer `rng` (a seed) and a `cache` (a cache.MazeCache, or True for the default
+#   cache), mazes and meshes are read from the cache instead of being generated again.
+def cached_maze(cache, rng, spec):
+    if cache == None or cache == False or not isinstance(rng, int) or isinstance(rng, bool):
+        return None
+    if cache == True:
+        cache = default_cache()
+    return cache.build({**spec, 'seed': rng})
+
+
+# One MazeCache for `cache=True`, so its in-memory entries are kept between calls
+shared_cache = None
+
+
+def default_cache():
+    global shared_cache
+    if shared_cache == None:
+        shared_cache = maze_cache.MazeCache()
+    return shared_cache
+
+
+def new_outer_cube(rows=6, cols=6, inset=0.15, inner_cube=False, save_image=False, rng=None, cache=None):
+    cached = cached_maze(cache, rng, {'type': 'outer_cube', 'rows': rows, 'cols': cols,
+                                      'inset': inset, 'show_outer_faces': False})
+    if cached != None:
+        grid, verts, faces = cached
+    else:
+        grid = OuterCube(rows=rows, cols=cols, clear=False, rng=rng)
+        algos.growing_tree(grid)
 
     if save_image is True:
         grid.render2d(os.path.join(dir, 'outer_cube.png'), frame_size=0,
@@ -17,14 +44,21 @@ def new_outer_cube(rows=6, cols=6, inset=0.15, inner_cube=False, save_image=Fals
                       grid_bg=(255, 255, 255, 0),
                       text_color=(55, 55, 55, 100))
 
+    if cached != None:
+        return create_outer_cube(grid, inner_cube=inner_cube, model=(verts, faces))
     return create_outer_cube(grid, show_outer_faces=False,
                              joined=True, inner_cube=inner_cube, inset=inset)
 
 
-def new_cube(rows=6, cols=6, levels=6, clear=False, inset=0.15, show_outer_faces=False, save_image=False):
-    grid = Cube(rows=rows, cols=cols,
-                levels=levels, clear=clear, inset=inset)
-    algos.growing_tree(grid)
+def new_cube(rows=6, cols=6, levels=6, clear=False, inset=0.15, show_outer_faces=False, save_image=False, rng=None, cache=None):
+    cached = cached_maze(cache, rng, {'type': 'cube', 'rows': rows, 'cols': cols, 'levels': levels,
+                                      'clear': clear, 'inset': inset, 'show_outer_faces': show_outer_faces})
+    if cached != None:
+        grid, verts, faces = cached
+    else:
+        grid = Cube(rows=rows, cols=cols,
+                    levels=levels, clear=clear, inset=inset, rng=rng)
+        algos.growing_tree(grid)
 
     if save_image is True:
         grid.render2d(os.path.join(dir, 'cube.png'), frame_size=0,
@@ -33,12 +67,20 @@ def new_cube(rows=6, cols=6, levels=6, clear=False, inset=0.15, show_outer_faces
                       grid_bg=(255, 255, 255, 0),
                       text_color=(55, 55, 55, 100))
 
-    create_cube(grid, show_outer_faces=show_outer_faces)
+    if cached != None:
+        create_cube(grid, model=(verts, faces))
+    else:
+        create_cube(grid, show_outer_faces=show_outer_faces)
 
 
-def new_mobius(rows=108, cols=10, height=0.4, minor_radius=2, smooth=True, save_image=False):
-    grid = Mobius(rows=rows, cols=cols, clear=False)
-    algos.growing_tree(grid)
+def new_mobius(rows=108, cols=10, height=0.4, minor_radius=2, smooth=True, save_image=False, rng=None, cache=None):
+    cached = cached_maze(cache, rng, {'type': 'mobius', 'rows': rows, 'cols': cols, 'major_radius': 5,
+                                      'minor_radius': minor_radius, 'thick': 0.1, 'height': height})
+    if cached != None:
+        grid, verts, faces = cached
+    else:
+        grid = Mobius(rows=rows, cols=cols, clear=False, rng=rng)
+        algos.growing_tree(grid)
 
     if save_image is True:
         grid.render2d("imgs/mobius.png", frame_size=0,
@@ -47,5 +89,5 @@ def new_mobius(rows=108, cols=10, height=0.4, minor_radius=2, smooth=True, save_
                       grid_bg=(255, 255, 255, 0),
                       text_color=(55, 55, 55, 100))
 
-    create_mobius_strip(grid, rows=rows, cols=cols,
-                        minor_radius=minor_radius, height=height, smooth=smooth)
+    create_mobius_strip(grid, rows=rows, cols=cols, minor_radius=minor_radius, height=height,
+                        smooth=smooth, model=(verts, faces) if cached != None else None)
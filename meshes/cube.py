@@ -1,13 +1,11 @@
-import bpy
-import random
+import numpy as np
 
-from .maze2d import RectGrid
-from .maze3d import VertState, vert_pos, RectCell3d
-from .utils.blender import new_mesh_obj
+from .maze2d import RectGrid, CellList, as_random, ABOVE, BELOW
+from .maze3d import vert_pos, RectCell3d
+from .cube_mesh import cube_mesh_arrays, cube_mesh_bricks, save_cube_bricks
+from .raster import save_atlas, save_levels, grid_layout
 from .utils.transform import *
 
-from PIL import ImageFont
-
 
 class Cube(RectGrid):
     col_block = RectGrid.col_block
@@ -18,9 +16,10 @@ class Cube(RectGrid):
     col_below = (255, 98, 0, 255)
     col_above_and_below = (192, 255, 0, 255)
 
-    def __init__(self, rows=10, cols=10, levels=3, weight=1, masked=False, clear=False, inset=0, cells=None):
+    def __init__(self, rows=10, cols=10, levels=3, weight=1, masked=False, clear=False, inset=0, cells=None, rng=None):
         assert inset >= 0 and inset <= 0.45
         self.inset = inset
+        self.rng = as_random(rng)
         cap2d = rows * cols
         cap3d = cap2d * levels
         self.cap = cap3d
@@ -29,44 +28,28 @@ class Cube(RectGrid):
         self.rows = rows
         self.cols = cols
         self.levels = levels
+        self.weight = weight
+        self.weights = None
+        self.masked = masked
+        self.link_bits = bytearray(cap3d)
         if cells == None:
-            self.cells = []
-            for level in range(levels):
-                for row in range(rows):
-                    for col in range(cols):
-                        id = self.calc_id(row, col, level)
-                        cell = RectCell3d(
-                            rows, cols, levels, cap2d, cap3d, id, row, col, level, weight, masked, clear, inset)
-                        self.cells.append(cell)
+            self.cells = CellList(self)
+            if clear:
+                for id in range(cap3d):
+                    self.link_all(id)
         else:
             self.cells = cells
 
+    def new_cell(self, id):
+        level, i = divmod(id, self.cap2d)
+        return RectCell3d(self, id, i // self.cols, i % self.cols, level)
+
     def calc_id(self, row, col, level):
         return level * self.cap2d + row * self.cols + col
 
     def get(self, row, col, level):
         return self.cells[self.calc_id(row, col, level)]
 
-    def connect_above(self, cell, above):
-        a = self.cells[above]
-        b = self.cells[cell]
-        if a.level - b.level == 1:
-            b.above = above
-            a.below = cell
-        else:
-            print(
-                f'Could not link above (below={cell} with above={above}): incompatible levels')
-
-    def connect_below(self, cell, below):
-        a = self.cells[cell]
-        b = self.cells[below]
-        if abs(a.level - b.level) == 1:
-            a.below = below
-            b.above = cell
-        else:
-            print(
-                f'Could not link below (below={below} with above={cell}): incompatible levels')
-
     def row(self, level, row):
         return filter(lambda cell: cell.level == level, super.row(self, row))
 
@@ -74,31 +57,38 @@ class Cube(RectGrid):
         return filter(lambda cell: cell.level == level, super.col(self, col))
 
     def level(self, level):
-        return filter(lambda cell: cell.level == level, self.cells)
+        return iter(self.cells[level*self.cap2d:(level+1)*self.cap2d])
 
     def random_cell(self):
-        return random.choice(self.cells)
+        return self.rng.choice(self.cells)
 
     def random_cell_on_level(self, level):
-        return random.choice(list(filter(lambda cell: cell.level == level, self.cells)))
-
-    def render2d(self, filename, block_size=70, frame_size=10, border_color=col_border, block_color=col_block, grid_bg=col_grid, text_color=col_text, show_labels=True, font=ImageFont.truetype("assets/DejaVuSansMono.ttf", 12)):
-        for level in range(self.levels):
-            parts = filename.rpartition(".")
-            file = f'{parts[0]}_{level}{parts[1]}{parts[2]}'
-            cells = list(self.level(level))
-
-            custom_bgs = {}
-            custom_text = {}
-
-            for cell in filter(lambda c: c.linked_to(c.below), cells):
-                custom_bgs[cell.id] = Cube.col_below
-            for cell in filter(lambda c: c.linked_to(c.above), cells):
-                custom_bgs[cell.id] = Cube.col_above if custom_bgs.get(
-                    cell.id) == None else Cube.col_above_and_below
-
-            RectGrid.render2d(self, file, block_size, frame_size, border_color,
-                              block_color, grid_bg, text_color, show_labels, font, cells, custom_bgs, custom_text)
+        return self.new_cell(self.rng.randrange(level * self.cap2d, (level + 1) * self.cap2d))
+
+    # Draws every level, either as separate PNGs (`maze_0.png`, `maze_1.png`, ... for
+    #   `maze.png`) or with `atlas` as tiles of one PNG, `columns` levels wide.  Levels
+    #   are drawn across `workers` processes (all cores if None, in this process if 0).
+    def render2d(self, filename, block_size=70, frame_size=10, border_color=col_border, block_color=col_block, grid_bg=col_grid, text_color=col_text, show_labels=True, font=None, compact=False, atlas=False, columns=None, workers=0, compress_level=6):
+        jobs = [self.level_job(level, block_size, frame_size, border_color, block_color, grid_bg,
+                               text_color, show_labels, font, self.level_bgs(level), {}, compact)
+                for level in range(self.levels)]
+        if atlas:
+            save_atlas(filename, jobs, grid_layout(self.levels, columns),
+                       workers, compress_level)
+        else:
+            save_levels(filename, jobs, workers, compress_level)
+
+    # Cells on `level` linked above and/or below are highlighted
+    def level_bgs(self, level):
+        first = level * self.cap2d
+        bits = np.frombuffer(self.link_bits, dtype=np.uint8)[first:first+self.cap2d]
+        custom_bgs = {}
+        for id in np.flatnonzero(bits & BELOW).tolist():
+            custom_bgs[first + id] = Cube.col_below
+        for id in np.flatnonzero(bits & ABOVE).tolist():
+            custom_bgs[first + id] = Cube.col_above if custom_bgs.get(
+                first + id) == None else Cube.col_above_and_below
+        return custom_bgs
 
     def vertex_indicies(self):
         verts = []
@@ -115,30 +105,23 @@ class Cube(RectGrid):
     # def generate_model_inset(self, show_outer_faces=False):
     def generate_model(self, show_outer_faces=False):
         # NOTE: show_outer_faces is ignored if `inset == 0`
-        state = VertState()
-        faces = []
-
-        if self.inset != 0:
-            for cell in self.cells:
-                for dir in ['above', 'below', 'north', 'east', 'south', 'west']:
-                    f = cell.draw_inset(dir, state)
-                    faces.extend(f)
-        else:
-            for cell in self.cells:
-                if cell.show_above_wall() and (cell.level != self.levels - 1 or show_outer_faces == True):
-                    faces.append(cell.inset_side_above(state))
-                if cell.show_north_wall() and (cell.row != 0 or show_outer_faces == True):
-                    faces.append(cell.inset_side_north(state))
-                if cell.show_east_wall() and (cell.col != self.cols - 1 or show_outer_faces == True):
-                    faces.append(cell.inset_side_east(state))
-                if cell.level == 0 and show_outer_faces:
-                    faces.append(cell.inset_side_below(state))
-                if cell.row == self.rows - 1 and show_outer_faces:
-                    faces.append(cell.inset_side_south(state))
-                if cell.col == 0 and show_outer_faces:
-                    faces.append(cell.inset_side_west(state))
-
-        return (state.verts, faces)
+        verts, faces = self.generate_model_arrays(show_outer_faces)
+        return (verts.tolist(), faces.tolist())
+
+    # Same as `generate_model()` but returns numpy arrays of verticies and quads
+    def generate_model_arrays(self, show_outer_faces=False):
+        return cube_mesh_arrays(self.link_bits, self.rows, self.cols, self.levels, self.inset, show_outer_faces)
+
+    # Yields (origin, verts, faces) for bricks of up to `size` cells on each side, where
+    #   origin is the (level, row, col) of the brick's first cell.  See cube_mesh.py.
+    def generate_model_bricks(self, show_outer_faces=False, size=32, workers=0):
+        return cube_mesh_bricks(self.link_bits, self.rows, self.cols, self.levels, self.inset,
+                                show_outer_faces, size, workers)
+
+    # Exports each brick to its own file and returns the filenames
+    def save_model_bricks(self, filename, show_outer_faces=False, size=32, workers=0):
+        return save_cube_bricks(filename, self.link_bits, self.rows, self.cols, self.levels, self.inset,
+                                show_outer_faces, size, workers)
 
     # Takes a list of vertifices for a maze.  Verticies should be centered around (0,0,0)
     def reorient_cube_face(self, face: int, verts: list):
@@ -181,6 +164,27 @@ class Cube(RectGrid):
                 verts = map_verts(mirror_z, verts)
                 return verts
 
+    # Affine matrix that moves a centered face of an OuterCube into place
+    def face_matrix(self, face: int):
+        offset = 0.5
+        x = self.rows / 2 + offset
+        y = self.cols / 2 + offset
+        z = self.levels / 2 + offset
+        match face:
+            case 0:
+                return compose(rotate_yz_ccw_matrix, translation(0, -x, 0))
+            case 1:
+                return compose(rotate_yz_ccw_matrix, translation(0, -x, 0), rotate_xy_ccw_matrix)
+            case 2:
+                return compose(rotate_yz_ccw_matrix, translation(0, -x, 0),
+                               rotate_xy_ccw_matrix, rotate_xy_ccw_matrix)
+            case 3:
+                return compose(rotate_yz_ccw_matrix, translation(0, -y, 0), rotate_xy_cw_matrix)
+            case 4:
+                return compose(translation(0, 0, x), rotate_xy_ccw_matrix)
+            case 5:
+                return compose(translation(0, 0, x), rotate_xy_ccw_matrix, mirror_x_matrix, mirror_z_matrix)
+
 
 # Expects a grid starting at (0,0,0) and ending at (x, -y, z)
 #   In other words: x and z are positive, y is inverted
@@ -191,6 +195,20 @@ def center_maze(grid: Cube, verts: list):
     return list(map(lambda v: point_offset(v, ox, oy, oz), verts))
 
 
-def create_cube(cube: Cube, name="cubic_maze", show_outer_faces=False):
-    verts, faces = cube.generate_model(show_outer_faces)
+def center_matrix(grid: Cube):
+    return translation(-(grid.cols / 2), grid.rows / 2, -(grid.levels / 2))
+
+
+# `model` is an already generated (verts, faces), such as from a cache.  With a
+#   `brick_size` the cube is split into one object per brick instead.
+def create_cube(cube: Cube, name="cubic_maze", show_outer_faces=False, model=None, brick_size=None, workers=0):
+    from .utils.blender import new_mesh_obj
+    if model == None and brick_size != None:
+        for (level, row, col), verts, faces in cube.generate_model_bricks(show_outer_faces, brick_size, workers):
+            new_mesh_obj(f'{name}_{level}_{row}_{col}', verts=verts, faces=faces)
+        return
+    if model == None:
+        verts, faces = cube.generate_model_arrays(show_outer_faces)
+    else:
+        verts, faces = model
     mesh = new_mesh_obj(name, verts=verts, faces=faces)
@@ -0,0 +1,258 @@
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from .maze2d import NORTH, EAST, SOUTH, WEST, ABOVE, BELOW
+from .utils.export import export_mesh
+
+# Vectorized version of the per-cell face methods in `RectCell3d`, used by
+#   `Cube.generate_model()`.
+#
+# Face corners are described by an inset slot for each axis (x, y, z):
+#   0 = outer left/top/bottom, 1 = inner left/top/bottom,
+#   2 = inner right/bottom/top, 3 = outer right/bottom/top
+#   which matches vix0..vix3, viy0..viy3 and viz0..viz3 in `RectCell3d`.
+
+# Inner inset sides (RectCell3d.inset_side_*)
+side_above = [(1, 1, 2), (2, 1, 2), (2, 2, 2), (1, 2, 2)]
+side_below = [(1, 1, 1), (2, 1, 1), (2, 2, 1), (1, 2, 1)]
+side_north = [(1, 1, 2), (2, 1, 2), (2, 1, 1), (1, 1, 1)]
+side_east = [(2, 1, 2), (2, 2, 2), (2, 2, 1), (2, 1, 1)]
+side_south = [(1, 2, 2), (2, 2, 2), (2, 2, 1), (1, 2, 1)]
+side_west = [(1, 1, 2), (1, 2, 2), (1, 2, 1), (1, 1, 1)]
+
+# Passage faces (RectCell3d.inset_faces_*)
+faces_above = [
+    [(1, 1, 2), (1, 2, 2), (1, 2, 3), (1, 1, 3)],
+    [(2, 1, 2), (2, 2, 2), (2, 2, 3), (2, 1, 3)],
+    [(1, 1, 2), (2, 1, 2), (2, 1, 3), (1, 1, 3)],
+    [(1, 2, 2), (2, 2, 2), (2, 2, 3), (1, 2, 3)],
+]
+faces_below = [
+    [(1, 1, 1), (1, 2, 1), (1, 2, 0), (1, 1, 0)],
+    [(2, 1, 1), (2, 2, 1), (2, 2, 0), (2, 1, 0)],
+    [(1, 1, 1), (2, 1, 1), (2, 1, 0), (1, 1, 0)],
+    [(1, 2, 1), (2, 2, 1), (2, 2, 0), (1, 2, 0)],
+]
+faces_north = [
+    [(1, 0, 2), (1, 1, 2), (1, 1, 1), (1, 0, 1)],
+    [(2, 0, 2), (2, 1, 2), (2, 1, 1), (2, 0, 1)],
+    [(1, 0, 2), (2, 0, 2), (2, 1, 2), (1, 1, 2)],
+    [(1, 0, 1), (2, 0, 1), (2, 1, 1), (1, 1, 1)],
+]
+faces_east = [
+    [(3, 1, 1), (2, 1, 1), (2, 1, 2), (3, 1, 2)],
+    [(3, 2, 1), (2, 2, 1), (2, 2, 2), (3, 2, 2)],
+    [(3, 1, 2), (2, 1, 2), (2, 2, 2), (3, 2, 2)],
+    [(3, 1, 1), (2, 1, 1), (2, 2, 1), (3, 2, 1)],
+]
+faces_south = [
+    [(1, 2, 2), (1, 3, 2), (1, 3, 1), (1, 2, 1)],
+    [(2, 2, 2), (2, 3, 2), (2, 3, 1), (2, 2, 1)],
+    [(1, 2, 2), (2, 2, 2), (2, 3, 2), (1, 3, 2)],
+    [(1, 2, 1), (2, 2, 1), (2, 3, 1), (1, 3, 1)],
+]
+faces_west = [
+    [(0, 1, 1), (1, 1, 1), (1, 1, 2), (0, 1, 2)],
+    [(0, 2, 1), (1, 2, 1), (1, 2, 2), (0, 2, 2)],
+    [(0, 1, 2), (1, 1, 2), (1, 2, 2), (0, 2, 2)],
+    [(0, 1, 1), (1, 1, 1), (1, 2, 1), (0, 2, 1)],
+]
+
+# Candidate faces for each cell, in the order `Cube.generate_model()` has always added them
+inset_dirs = [
+    (ABOVE, side_above, faces_above),
+    (BELOW, side_below, faces_below),
+    (NORTH, side_north, faces_north),
+    (EAST, side_east, faces_east),
+    (SOUTH, side_south, faces_south),
+    (WEST, side_west, faces_west),
+]
+inset_templates = np.array(
+    [f for _, side, faces in inset_dirs for f in [side] + faces], dtype=np.int8)
+flat_templates = np.array([side_above, side_north, side_east,
+                          side_below, side_south, side_west], dtype=np.int8)
+
+
+# Returns (verts, faces) as numpy arrays with shapes (n, 3) and (m, 4) for a cube
+#   maze with the given link bits (one byte per cell, in cell id order).  The result
+#   matches the per-cell version of `Cube.generate_model()` vertex for vertex.
+def cube_mesh_arrays(link_bits, rows, cols, levels, inset=0, show_outer_faces=False):
+    bits = np.frombuffer(link_bits, dtype=np.uint8)
+    assert len(bits) == rows * cols * levels
+    return cells_mesh_arrays(bits, np.arange(len(bits)), rows, cols, levels, inset, show_outer_faces)
+
+
+# Same as `cube_mesh_arrays()` for only the cells with ids `ids`, whose link bits are `bits`
+def cells_mesh_arrays(bits, ids, rows, cols, levels, inset=0, show_outer_faces=False):
+    bits = np.asarray(bits, dtype=np.uint8).reshape(-1, 1)
+    level = ids // (rows * cols)
+    row = ids // cols % rows
+    col = ids % cols
+
+    if inset != 0:
+        templates = inset_templates
+        mask = np.empty((len(bits), len(templates)), dtype=bool)
+        for i, (bit, side, faces) in enumerate(inset_dirs):
+            wall = bits[:, 0] & bit == 0
+            mask[:, i*5] = wall
+            mask[:, i*5+1:i*5+5] = ~wall[:, np.newaxis]
+    else:
+        templates = flat_templates
+        outer = bool(show_outer_faces)
+        mask = np.stack([
+            (bits[:, 0] & ABOVE == 0) & ((level != levels - 1) | outer),
+            (bits[:, 0] & NORTH == 0) & ((row != 0) | outer),
+            (bits[:, 0] & EAST == 0) & ((col != cols - 1) | outer),
+            (level == 0) & outer,
+            (row == rows - 1) & outer,
+            (col == 0) & outer,
+        ], axis=1)
+
+    selected = np.flatnonzero(mask)
+    cell = selected // len(templates)
+    size = (4 * cols + 1) * (4 * rows + 1) * (4 * levels + 1)
+    dtype = np.int32 if size < 2**31 else np.int64
+    base = lattice_key(4 * col, 4 * row, 4 * level, rows, cols).astype(dtype)
+    keys = base[cell, np.newaxis] + \
+        template_keys(templates, rows, cols, inset).astype(dtype)[selected % len(templates)]
+    return index_verts(keys, rows, cols, inset)
+
+
+# Tiled meshing for big cubes.
+#
+# The cube is split into bricks of up to `size` cells along each side, and each brick is
+#   meshed on its own (in parallel with `workers`).  A cell's faces only depend on its
+#   own link bits, so the bricks' faces are exactly the faces of the whole mesh split by
+#   cell, and verticies on the boundary between two bricks have the same coordinates in
+#   both.  Jobs are created as they're needed and at most 2 * workers bricks are in
+#   flight at once, so memory depends on the brick size rather than the cube size.
+
+
+# (level, row, col) of the first cell of each brick
+def brick_origins(rows, cols, levels, size=32):
+    for level in range(0, levels, size):
+        for row in range(0, rows, size):
+            for col in range(0, cols, size):
+                yield (level, row, col)
+
+
+# Picklable description of one brick for `brick_mesh()`
+def brick_job(link_bits, origin, rows, cols, levels, inset=0, show_outer_faces=False, size=32, filename=None):
+    level, row, col = origin
+    bits = np.frombuffer(link_bits, dtype=np.uint8).reshape(levels, rows, cols)
+    return {
+        'bits': bits[level:level+size, row:row+size, col:col+size].copy(),
+        'origin': origin,
+        'dims': (rows, cols, levels),
+        'inset': inset,
+        'show_outer_faces': show_outer_faces,
+        'filename': filename,
+    }
+
+
+# Returns (origin, verts, faces) for a brick
+def brick_mesh(job):
+    bits = job['bits']
+    level, row, col = job['origin']
+    rows, cols, levels = job['dims']
+    l, r, c = np.meshgrid(np.arange(level, level + bits.shape[0]), np.arange(row, row + bits.shape[1]),
+                          np.arange(col, col + bits.shape[2]), indexing='ij')
+    ids = (l * rows + r) * cols + c
+    verts, faces = cells_mesh_arrays(bits.ravel(), ids.ravel(), rows, cols, levels,
+                                     job['inset'], job['show_outer_faces'])
+    return (job['origin'], verts, faces)
+
+
+# Meshes a brick and writes it to the job's filename
+def export_brick(job):
+    origin, verts, faces = brick_mesh(job)
+    export_mesh(job['filename'], verts, faces)
+    return job['filename']
+
+
+# Yields (origin, verts, faces) for each brick, in `brick_origins()` order
+def cube_mesh_bricks(link_bits, rows, cols, levels, inset=0, show_outer_faces=False, size=32, workers=0):
+    jobs = (brick_job(link_bits, origin, rows, cols, levels, inset, show_outer_faces, size)
+            for origin in brick_origins(rows, cols, levels, size))
+    if workers == 0:
+        yield from map(brick_mesh, jobs)
+    else:
+        yield from bounded_map(brick_mesh, jobs, workers)
+
+
+# Writes every brick to its own file, named like `maze_0_32_64.ply` for `maze.ply` where
+#   the numbers are the level, row and column of the brick's first cell.  Workers write
+#   the files themselves, so the meshes are never collected in this process.
+def save_cube_bricks(filename, link_bits, rows, cols, levels, inset=0, show_outer_faces=False, size=32, workers=0):
+    parts = filename.rpartition('.')
+    jobs = (brick_job(link_bits, origin, rows, cols, levels, inset, show_outer_faces, size,
+                      f'{parts[0]}_{origin[0]}_{origin[1]}_{origin[2]}{parts[1]}{parts[2]}')
+            for origin in brick_origins(rows, cols, levels, size))
+    if workers == 0:
+        return list(map(export_brick, jobs))
+    return list(bounded_map(export_brick, jobs, workers))
+
+
+# Like `pool.map()`, but only submits jobs as results are taken: at most `2 * workers`
+#   jobs are queued or finished but not yet yielded.  Results are yielded in order.
+#   `workers` can be None for all cores.
+def bounded_map(func, jobs, workers):
+    if workers == None:
+        workers = os.cpu_count() or 1
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = deque()
+        for job in jobs:
+            pending.append(pool.submit(func, job))
+            if len(pending) >= 2 * workers:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def lattice_key(kx, ky, kz, rows, cols):
+    return kx + (4 * cols + 1) * (ky + (4 * rows + 1) * kz)
+
+
+# Integer lattice offset (cell coordinate * 4 + inset slot) of every template corner
+#   from the cell's outer corner.  Outer right slots belong to the next cell, and
+#   without an inset the inner slots are the same point as the outer slots.
+def template_keys(templates, rows, cols, inset):
+    if inset != 0:
+        offsets = np.array([0, 1, 2, 4])
+    else:
+        offsets = np.array([0, 0, 4, 4])
+    k = offsets[templates]
+    return lattice_key(k[:, :, 0], k[:, :, 1], k[:, :, 2], rows, cols)
+
+
+# Deduplicates lattice keys, numbering vertices in the order they are first used
+def index_verts(keys, rows, cols, inset):
+    unique, first, inverse = np.unique(
+        keys.ravel(), return_index=True, return_inverse=True)
+    order = np.argsort(first, kind='stable')
+    rank = np.empty_like(order)
+    rank[order] = np.arange(len(order))
+    faces = rank[inverse].reshape(keys.shape)
+
+    verts = lattice_verts(unique[order], 4 * cols + 1, 4 * rows + 1, inset)
+    return (verts, faces)
+
+
+# Real coordinates for combined lattice keys in a lattice that is `nx` by `ny` points
+#   wide and starts `margin` cells before (0, 0, 0).  Rows go along the negative y axis.
+def lattice_verts(keys, nx, ny, inset, margin=0):
+    kx = keys % nx - 4 * margin
+    ky = keys // nx % ny - 4 * margin
+    kz = keys // (nx * ny) - 4 * margin
+    # adding 0.0 avoids negative zeros along the y axis
+    return np.stack([lattice_coords(kx, inset), 0.0 - lattice_coords(ky, inset),
+                     lattice_coords(kz, inset)], axis=1)
+
+
+def lattice_coords(keys, inset):
+    cell = keys // 4
+    slot = keys % 4
+    return np.where(slot == 0, cell, np.where(slot == 1, cell + inset, cell + 1 - inset)).astype(float)
@@ -0,0 +1,135 @@
+import numpy as np
+
+from .maze2d import RectGrid, NORTH, EAST, SOUTH, WEST, ABOVE, BELOW
+from .cube import Cube
+
+# Neighbor tables and edge lists for whole grids as numpy arrays.
+#
+# Neighbors inside a level follow the plain row/col/level formulas, so they are computed
+#   with array math.  Grids like `Cylinder`, `Mobius` and `OuterCube` only rewire cells on
+#   the edges of a level, so those cells are looked up with `grid.new_cell()`.
+
+directions = [NORTH, EAST, SOUTH, WEST, ABOVE, BELOW]
+direction_bits = np.array(directions, dtype=np.uint8)
+opposite = {NORTH: SOUTH, EAST: WEST, SOUTH: NORTH, WEST: EAST, ABOVE: BELOW, BELOW: ABOVE}
+
+
+# Returns an array with shape (cap, 6) of neighbor ids, one column per entry in
+#   `directions`, with -1 where a cell has no neighbor in that direction.  Ids are int32
+#   unless the grid has 2**31 cells or more.
+def neighbor_table(grid):
+    rows = grid.rows
+    cols = grid.cols
+    levels = getattr(grid, 'levels', 1)
+    cap2d = rows * cols
+    ids = np.arange(grid.cap, dtype=np.int32 if grid.cap < 2**31 else np.int64)
+    level = ids // cap2d
+    row = ids // cols % rows
+    col = ids % cols
+    stacked = is_stacked(grid)
+
+    table = np.full((grid.cap, len(directions)), -1, dtype=ids.dtype)
+    table[:, 0] = np.where(row > 0, ids - cols, -1)
+    table[:, 1] = np.where(col < cols - 1, ids + 1, -1)
+    table[:, 2] = np.where(row < rows - 1, ids + cols, -1)
+    table[:, 3] = np.where(col > 0, ids - 1, -1)
+    if stacked:
+        table[:, 4] = np.where(level < levels - 1, ids + cap2d, -1)
+        table[:, 5] = np.where(level > 0, ids - cap2d, -1)
+
+    column = {bit: i for i, bit in enumerate(directions)}
+    edge = (row == 0) | (row == rows - 1) | (col == 0) | (col == cols - 1)
+    for id in np.flatnonzero(edge).tolist():
+        table[id] = -1
+        for n, bit in grid.new_cell(id).directions():
+            table[id, column[bit]] = n
+    return table
+
+
+# True if the grid's levels are stacked, with cells above and below each other.
+#   `OuterCube` levels are the faces of a cube, which have no cells above or below.
+def is_stacked(grid):
+    return getattr(grid.new_cell(0), 'above', None) != None
+
+
+# Returns the undirected edges of a grid as arrays (a, b, bit_a, bit_b) with a < b, where
+#   bit_a links a to b and bit_b links b to a, the same bits `grid.link(a, b)` sets.
+#   Edges are in order of a, then b.
+def grid_edges(grid, table=None):
+    if table is None:
+        table = neighbor_table(grid)
+    # sorting each cell's neighbors puts the edges in order and duplicates side by side
+    dst = np.sort(table, axis=1)
+    keep = dst > np.arange(len(table))[:, np.newaxis]
+    keep[:, 1:] &= dst[:, 1:] != dst[:, :-1]
+    a = np.nonzero(keep)[0]
+    b = dst[keep]
+    bit_a = link_bits_to(table, a, b)
+    bit_b = link_bits_to(table, b, a)
+    return (a, b, bit_a, bit_b)
+
+
+# Bits for every direction from cells `a` that leads to cells `b`
+def link_bits_to(table, a, b):
+    matches = table[a] == b[:, np.newaxis]
+    return np.bitwise_or.reduce(np.where(matches, direction_bits, 0).astype(np.uint8), axis=1)
+
+
+# Neighbors of a cell from the row/col/level formulas, as (n, bit) in `directions` order
+def plain_neighbors(id, rows, cols, levels, stacked):
+    cap2d = rows * cols
+    i = id % cap2d
+    col = i % cols
+    found = []
+    if i >= cols:
+        found.append((id - cols, NORTH))
+    if col < cols - 1:
+        found.append((id + 1, EAST))
+    if i < cap2d - cols:
+        found.append((id + cols, SOUTH))
+    if col > 0:
+        found.append((id - 1, WEST))
+    if stacked:
+        if id < (levels - 1) * cap2d:
+            found.append((id + cap2d, ABOVE))
+        if id >= cap2d:
+            found.append((id - cap2d, BELOW))
+    return found
+
+
+# Cells whose neighbors don't follow the row/col/level formulas, such as the wrapped and
+#   rewired edges of `Cylinder`, `Mobius` and `OuterCube` grids, and the cells next to
+#   them.  Returns {id: ((n, to, back), ...)} in `directions` order, where `to` is the
+#   link bits from id to n and `back` the link bits from n to id.  Plain grids give an
+#   empty dict, and only edge cells are looked up with `grid.new_cell()`.
+def rewired_neighbors(grid):
+    if type(grid).new_cell in (RectGrid.new_cell, Cube.new_cell):
+        return {}
+    rows = grid.rows
+    cols = grid.cols
+    levels = getattr(grid, 'levels', 1)
+    stacked = is_stacked(grid)
+    cap2d = rows * cols
+    rewired = {}
+    pending = []
+    for level in range(levels):
+        first = level * cap2d
+        for row in range(rows):
+            step = 1 if row == 0 or row == rows - 1 else max(cols - 1, 1)
+            pending.extend(range(first + row * cols, first + (row + 1) * cols, step))
+    checked = set()
+    while pending:
+        id = pending.pop()
+        if id in checked:
+            continue
+        checked.add(id)
+        cell = grid.new_cell(id)
+        entries = tuple((n, cell.direction_to(n), grid.new_cell(n).direction_to(id))
+                        for n, bit in cell.directions())
+        plain = tuple((n, bit, opposite[bit])
+                      for n, bit in plain_neighbors(id, rows, cols, levels, stacked))
+        if entries != plain:
+            rewired[id] = entries
+            pending.extend(n for n, bit in cell.directions())
+            pending.extend(n for n, bit in plain_neighbors(id, rows, cols, levels, stacked))
+    return rewired
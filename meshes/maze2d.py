@@ -1,25 +1,78 @@
 import random
 import sys
-from PIL import Image, ImageDraw, ImageFont
-
-
-# deterministic = True
-# if deterministic:
-#     random.seed(1778)
-
-
+from array import array
+
+font_file = "assets/DejaVuSansMono.ttf"
+fonts = {}
+
+
+# Returns a random number generator for a grid or maze generator.  `rng` can be None
+#   (use the global `random` module), a seed, a random.Random instance, or a numpy
+#   Generator (which seeds a new random.Random, so the result is still deterministic).
+def as_random(rng=None):
+    if rng == None:
+        return random
+    if isinstance(rng, random.Random) or rng is random:
+        return rng
+    if isinstance(rng, int):
+        return random.Random(rng)
+    if hasattr(rng, 'integers'):
+        return random.Random(int(rng.integers(2**63)))
+    raise TypeError(f'Unsupported random number generator: {rng!r}')
+
+
+# Fonts (and Pillow) are loaded the first time a grid is rendered
+def load_font(size=12):
+    font = fonts.get(size)
+    if font == None:
+        from PIL import ImageFont
+        font = ImageFont.truetype(font_file, size)
+        fonts[size] = font
+    return font
+
+
+# Link bits.  Every cell stores one bit per direction in its grid's `link_bits`
+#   array, which is set when the cell is linked to the neighbor in that direction.
+NORTH = 1
+EAST = 2
+SOUTH = 4
+WEST = 8
+ABOVE = 16
+BELOW = 32
+LINKS_2D = NORTH | EAST | SOUTH | WEST
+
+
+# Cells are lightweight views over a grid's link storage.  They are created on
+#   demand by `RectGrid.new_cell()`, neighbors are calculated from the cell's
+#   position, and links are read from `grid.link_bits`.
 class RectCell:
-    def __init__(self, rows, cols, cap, id, row, col, weight=1, masked=False, clear=False):
+    __slots__ = ('grid', 'id', 'row', 'col', 'level',
+                 'north', 'east', 'south', 'west')
+
+    def __init__(self, grid, id, row, col):
+        self.grid = grid
         self.id = id
         self.row = row
         self.col = col
-        self.links = []
-        self.masked = masked
-        self.weight = weight
         self.level = None
-        self.calc_neighbors(rows, cols)
-        if clear:
-            self.links.extend(self.neighbors())
+        self.calc_neighbors(grid.rows, grid.cols)
+
+    @property
+    def links(self):
+        bits = self.grid.link_bits[self.id]
+        return [n for n, bit in self.directions() if bits & bit]
+
+    @property
+    def weight(self):
+        return self.grid.cell_weight(self.id)
+
+    @weight.setter
+    def weight(self, weight):
+        self.grid.set_weight(self.id, weight)
+
+    @property
+    def masked(self):
+        return self.grid.masked
 
     def string(self):
         return f'id={self.id} row={self.row} col={self.col} links={self.links} masked={self.masked} weight={self.weight}\n\tn={self.n} e={self.e} s={self.s} w={self.w}'
@@ -38,35 +91,55 @@ class RectCell:
         return list(filter(lambda d: not d is None, [
             self.north, self.east, self.south, self.west]))
 
+    # (neighbor, link bit) pairs for every existing neighbor
+    def directions(self):
+        return [(n, bit) for n, bit in [(self.north, NORTH), (self.east, EAST), (self.south, SOUTH), (self.west, WEST)] if n is not None]
+
+    # Link bits for every direction that leads to neighbor `n`
+    def direction_to(self, n):
+        if n == None:
+            return 0
+        bits = 0
+        if n == self.north:
+            bits |= NORTH
+        if n == self.east:
+            bits |= EAST
+        if n == self.south:
+            bits |= SOUTH
+        if n == self.west:
+            bits |= WEST
+        return bits
+
     def linked_to(self, n):
-        return n in self.links
+        return self.grid.link_bits[self.id] & self.direction_to(n) != 0
 
     def has_links(self):
-        return len(self.links) != 0
+        return self.grid.link_bits[self.id] != 0
 
     def linked_west(self):
-        return self.linked_to(self.west)
+        return self.grid.link_bits[self.id] & WEST != 0
 
     def linked_east(self):
-        return self.linked_to(self.east)
+        return self.grid.link_bits[self.id] & EAST != 0
 
     def linked_north(self):
-        return self.linked_to(self.north)
+        return self.grid.link_bits[self.id] & NORTH != 0
 
     def linked_south(self):
-        return self.linked_to(self.south)
+        return self.grid.link_bits[self.id] & SOUTH != 0
 
+    # Link bits are only set for existing neighbors, so a missing bit is a wall
     def show_north_wall(self):
-        return self.north == None or not self.linked_to(self.north)
+        return self.grid.link_bits[self.id] & NORTH == 0
 
     def show_east_wall(self):
-        return self.east == None or not self.linked_to(self.east)
+        return self.grid.link_bits[self.id] & EAST == 0
 
     def show_south_wall(self):
-        return self.south == None or not self.linked_to(self.south)
+        return self.grid.link_bits[self.id] & SOUTH == 0
 
     def show_west_wall(self):
-        return self.west == None or not self.linked_to(self.west)
+        return self.grid.link_bits[self.id] & WEST == 0
 
     def border_west(self):
         return self.west == None
@@ -81,10 +154,10 @@ class RectCell:
         return self.south == None
 
     def random_neighbor(self):
-        return random.choice(self.neighbors())
+        return self.grid.rng.choice(self.neighbors())
 
     def random_link(self):
-        return random.choice(self.links)
+        return self.grid.rng.choice(self.links)
 
 
 class RectGrid:
@@ -93,13 +166,35 @@ class RectGrid:
     col_grid = (255, 255, 255, 127)
     col_text = (55, 55, 55, 255)
 
-    def __init__(self, rows=10, cols=10, clear=False):
+    def __init__(self, rows=10, cols=10, clear=False, rng=None):
         cap = rows * cols
         self.cap = cap
         self.rows = rows
         self.cols = cols
-        self.cells = list(
-            map(lambda i: RectCell(rows, cols, cap, i, i // cols, i % cols, clear=clear), range(cap)))
+        self.rng = as_random(rng)
+        self.weight = 1
+        self.weights = None
+        self.masked = False
+        self.link_bits = bytearray(cap)
+        self.cells = CellList(self)
+        if clear:
+            for id in range(cap):
+                self.link_all(id)
+
+    def new_cell(self, id: int):
+        return RectCell(self, id, id // self.cols, id % self.cols)
+
+    # Every cell has the grid's `weight` (the cost of entering it, see solver.py) until
+    #   one is changed.  Then `weights` holds one float per cell, next to `link_bits`.
+    def cell_weight(self, id: int):
+        if self.weights == None:
+            return self.weight
+        return self.weights[id]
+
+    def set_weight(self, id: int, weight):
+        if self.weights == None:
+            self.weights = array('d', [self.weight]) * self.cap
+        self.weights[id] = weight
 
     def row(self, row: int):
         return filter(lambda cell: cell.row == row, self.cell_rows)
@@ -114,23 +209,19 @@ class RectGrid:
         return self.cells[id]
 
     def random_cell(self):
-        return random.choice(self.cells)
+        return self.rng.choice(self.cells)
 
     def link(self, a, b):
         if a == None or b == None:
             return
-        if not b in self.cells[a].links:
-            self.cells[a].links.append(b)
-        if not a in self.cells[b].links:
-            self.cells[b].links.append(a)
+        self.link_bits[a] |= self.lookup(a).direction_to(b)
+        self.link_bits[b] |= self.lookup(b).direction_to(a)
 
     def unlink(self, a, b):
         if a == None or b == None:
             return
-        if b in self.cells[a].links:
-            self.cells[a].links.remove(b)
-        if a in self.cells[b].links:
-            self.cells[b].links.remove(a)
+        self.link_bits[a] &= ~self.lookup(a).direction_to(b)
+        self.link_bits[b] &= ~self.lookup(b).direction_to(a)
 
     def link_all(self, id: int):
         cell = self.cells[id]
@@ -149,43 +240,76 @@ class RectGrid:
         right = left + block_size
         return Block(left, right, top, bottom)
 
-    def render2d(self, filename, block_size=70, frame_size=10, border_color=col_border, block_color=col_block, grid_bg=col_grid, text_color=col_text, show_labels=True, font=ImageFont.truetype("assets/DejaVuSansMono.ttf", 12), cells=None, custom_bgs={}, custom_text={}):
-        if cells == None:
-            cells = self.cells
-        width = self.cols * block_size + frame_size * 2
-        height = self.rows * block_size + frame_size * 2
-        img = Image.new('RGBA', (width+1, height+1), (0, 0, 0, 0))
-        draw = ImageDraw.Draw(img)
-        draw.rectangle([(0 + frame_size, 0 + frame_size),
-                       (width-frame_size, height-frame_size)], fill=grid_bg)
-        for cell in cells:
-            block = self.block(cell, frame_size, block_size)
-            block_bg = custom_bgs.get(cell.id, block_color)
-            block.draw_bg(draw, block_bg)
-            if not cell.linked_west():
-                block.draw_west(draw, border_color)
-            if not cell.linked_east():
-                block.draw_east(draw, border_color)
-            if not cell.linked_north():
-                block.draw_north(draw, border_color)
-            if not cell.linked_south():
-                block.draw_south(draw, border_color)
-            if show_labels:
-                block_text = custom_text.get(cell.id, str(cell.id))
-                block.draw_text(draw, block_text, text_color, font)
-
-        img.save(filename, "PNG")
+    # Draws the maze with numpy (see meshes/raster.py) and saves it as a PNG.  `level`
+    #   draws one level of a grid with levels.  `compact` draws one pixel per cell and
+    #   wall (without labels) for previews of large mazes.  `compress_level` is passed
+    #   to Pillow: 0 is uncompressed, 1 is fastest and 9 is smallest.
+    def render2d(self, filename, block_size=70, frame_size=10, border_color=col_border, block_color=col_block, grid_bg=col_grid, text_color=col_text, show_labels=True, font=None, level=None, custom_bgs={}, custom_text={}, compact=False, compress_level=6):
+        from .raster import render_job
+        job = self.level_job(level, block_size, frame_size, border_color, block_color, grid_bg,
+                             text_color, show_labels, font, custom_bgs, custom_text, compact)
+        render_job({**job, 'filename': filename, 'compress_level': compress_level})
+
+    # Everything `raster.level_image()` needs to draw one level.  Jobs don't refer to
+    #   the grid, so levels can be drawn in other processes.
+    def level_job(self, level, block_size, frame_size, border_color, block_color, grid_bg, text_color, show_labels, font, custom_bgs, custom_text, compact):
+        cap = self.rows * self.cols
+        first = 0 if level == None else level * cap
+        labels = None
+        if show_labels and not compact:
+            labels = [custom_text.get(id, str(id))
+                      for id in range(first, first + cap)]
+        return {
+            'link_bits': bytes(self.link_bits[first:first+cap]),
+            'rows': self.rows,
+            'cols': self.cols,
+            'block_size': block_size,
+            'frame_size': frame_size,
+            'border_color': border_color,
+            'block_color': block_color,
+            'grid_bg': grid_bg,
+            'text_color': text_color,
+            # only this level's cells, so ids from other levels can't color the wrong cell
+            'bgs': {id - first: color for id, color in custom_bgs.items() if first <= id < first + cap},
+            'labels': labels,
+            'font': font,
+            'compact': compact,
+        }
+
+
+# Sequence of cell views for a grid.  Cells are created when they are accessed,
+#   so only the grid's link storage is kept in memory.
+class CellList:
+    def __init__(self, grid):
+        self.grid = grid
+
+    def __len__(self):
+        return self.grid.cap
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self.grid.new_cell(id) for id in range(*i.indices(self.grid.cap))]
+        if i < 0:
+            i += self.grid.cap
+        if i < 0 or i >= self.grid.cap:
+            raise IndexError('cell index out of range')
+        return self.grid.new_cell(i)
+
+    def __iter__(self):
+        return map(self.grid.new_cell, range(self.grid.cap))
 
 
 class Cylinder(RectGrid):
-    def __init__(self, rows=10, cols=10, clear=False):
-        super().__init__(rows, cols, clear)
-        for cell in filter(lambda cell: cell.col == self.cols - 1, self.cells):
+    def __init__(self, rows=10, cols=10, clear=False, rng=None):
+        super().__init__(rows, cols, clear, rng)
+
+    def new_cell(self, id: int):
+        cell = super().new_cell(id)
+        if cell.col == self.cols - 1:
             cell.east = cell.id + 1 - self.cols
-            print(f'id={cell.id}: east = {cell.east}')
-        for cell in filter(lambda cell: cell.col == 0, self.cells):
+        if cell.col == 0:
             cell.west = cell.id + self.cols - 1
-            print(f'id={cell.id}: west = {cell.west}')
+        return cell
 
     def get(self, row, col):
         return self.cells[row*self.cols + (col % self.cols)]
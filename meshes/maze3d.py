@@ -1,48 +1,69 @@
-import bpy
 import copy
+from array import array
+
+import numpy as np
 
 from .utils.transform import *
-from .maze2d import RectCell, RectGrid
+from .maze2d import RectCell, RectGrid, NORTH, EAST, SOUTH, WEST, ABOVE, BELOW, LINKS_2D
+from .cube_mesh import lattice_verts
+
+dir_bits = {'above': ABOVE, 'below': BELOW, 'north': NORTH,
+            'east': EAST, 'south': SOUTH, 'west': WEST}
 
 
+# Vertex index for the per-cell face methods.
+#   Verticies are looked up by their integer lattice position: the cell coordinate * 4
+#   plus an inset slot along each axis (0 = outer near side, 1 = inner near side,
+#   2 = inner far side; the outer far side is the next cell's slot 0), which makes
+#   deduplication exact.  The lattice is dense and allocated up front with one cell of
+#   margin on every side for outside connections, so a lookup is a single array access.
+#   Real coordinates are only calculated when `verts` is read.
 class VertState:
-    def __init__(self, log=False):
+    def __init__(self, rows, cols, levels, inset=0, log=False):
         self.log = log
-        self.verts = []
-        self.vdict = {}
+        self.inset = inset
+        self.margin = 1
+        self.nx = 4 * (cols + 2 * self.margin) + 1
+        self.ny = 4 * (rows + 2 * self.margin) + 1
+        nz = 4 * (levels + 2 * self.margin) + 1
+        self.nxy = self.nx * self.ny
+        m = 4 * self.margin
+        self.origin = m + self.nx * m + self.nxy * m
+        self.index = array('q', [-1]) * (self.nxy * nz)
+        self.keys = array('q')
 
     def lookup(self, v):
-        i = self.vdict.get(v)
-        if i == None:
+        x, y, z = v
+        key = self.origin + x + self.nx * y + self.nxy * z
+        i = self.index[key]
+        if i == -1:
             if self.log:
                 print(f'adding {v}')
-            self.verts.append(v)
-            pos = len(self.verts)-1
-            self.vdict[v] = pos
-            if self.log:
-                print(f'verts={self.verts}')
-                print(f'vdict={self.vdict}')
-            return pos
-        else:
-            if self.log:
-                print(f'found {v}')
-            return i
+            i = len(self.keys)
+            self.index[key] = i
+            self.keys.append(key)
+        elif self.log:
+            print(f'found {v}')
+        return i
+
+    @property
+    def verts(self):
+        keys = np.frombuffer(self.keys, dtype=np.int64)
+        verts = lattice_verts(keys, self.nx, self.ny, self.inset, self.margin)
+        return list(map(tuple, verts.tolist()))
 
 
 class RectCell3d(RectCell):
-    def __init__(self, rows, cols, levels, cap2d, cap3d, id, row, col, level, weight=1, masked=False, clear=False, inset=0):
-        assert inset >= 0 and inset <= 0.45
+    __slots__ = ('above', 'below', 'inset')
+
+    def __init__(self, grid, id, row, col, level):
+        self.grid = grid
         self.id = id
         self.row = row
         self.col = col
         self.level = level
-        self.links = []
-        self.masked = masked
-        self.weight = weight
-        self.inset = inset
-        self.calc_neighbors_3d(rows, cols, levels, cap2d)
-        if clear:
-            self.links.extend(self.neighbors_3d())
+        self.inset = grid.inset
+        self.calc_neighbors_3d(grid.rows, grid.cols, grid.levels, grid.cap2d)
 
     def flatten_cell(self, inset=0.0):
         new = copy.copy(self)
@@ -83,25 +104,38 @@ class RectCell3d(RectCell):
     def neighbors(self):
         return self.neighbors_3d()
 
+    def directions(self):
+        return [(n, bit) for n, bit in [(self.north, NORTH), (self.east, EAST), (self.south, SOUTH), (self.west, WEST), (self.above, ABOVE), (self.below, BELOW)] if n is not None]
+
+    def direction_to(self, n):
+        if n == None:
+            return 0
+        bits = RectCell.direction_to(self, n)
+        if n == self.above:
+            bits |= ABOVE
+        if n == self.below:
+            bits |= BELOW
+        return bits
+
     # Link methods
 
     def linked_above(self):
-        return self.linked_to(self.above)
+        return self.grid.link_bits[self.id] & ABOVE != 0
 
     def linked_below(self):
-        return self.linked_to(self.below)
+        return self.grid.link_bits[self.id] & BELOW != 0
 
     def has_links(self):
-        return self.north in self.links or self.east in self.links or self.south in self.links or self.west in self.links
+        return self.grid.link_bits[self.id] & LINKS_2D != 0
 
     def has_links_3d(self):
-        return len(self.links) != 0
+        return self.grid.link_bits[self.id] != 0
 
     def show_above_wall(self):
-        return self.above == None or not self.linked_to(self.above)
+        return self.grid.link_bits[self.id] & ABOVE == 0
 
     def show_below_wall(self):
-        return self.below == None or not self.linked_to(self.below)
+        return self.grid.link_bits[self.id] & BELOW == 0
 
     def has_neighbor_at(self, dir):
         match dir:
@@ -113,13 +147,7 @@ class RectCell3d(RectCell):
             case 'west': return self.west != None
 
     def linked_at(self, dir):
-        match dir:
-            case 'above': return self.linked_above()
-            case 'below': return self.linked_below()
-            case 'north': return self.linked_north()
-            case 'east': return self.linked_east()
-            case 'south': return self.linked_south()
-            case 'west': return self.linked_west()
+        return self.grid.link_bits[self.id] & dir_bits[dir] != 0
 
     def is_edge(self, grid, dir):
         match dir:
@@ -131,13 +159,7 @@ class RectCell3d(RectCell):
             case 'west': return self.col == 0
 
     def show_wall(self, dir):
-        match dir:
-            case 'above': return self.show_above_wall()
-            case 'below': return self.show_below_wall()
-            case 'north': return self.show_north_wall()
-            case 'east': return self.show_east_wall()
-            case 'south': return self.show_south_wall()
-            case 'west': return self.show_west_wall()
+        return self.grid.link_bits[self.id] & dir_bits[dir] == 0
 
     # Verticies
 
@@ -165,51 +187,45 @@ class RectCell3d(RectCell):
     def vnea(self):
         return vert_pos(self.col+1, self.row, self.level+1)
 
-    # Inset verticies
+    # Inset verticies (as integer lattice positions, see `VertState`)
+    #   Without an inset the inner slots are the same points as the outer ones.
 
     def vix0(self):
-        return self.col
-        # return self.neg0(self.col, self.inset)
+        return 4 * self.col
 
     def vix1(self):
-        return self.col + self.inset
-        # return self.neg1(self.col, self.inset)
+        return 4 * self.col + (1 if self.inset else 0)
 
     def vix2(self):
-        return self.col + 1 - self.inset
-        # return self.neg2(self.col, self.inset)
+        return 4 * self.col + (2 if self.inset else 4)
 
     def vix3(self):
-        return self.col + 1
-        # # return self.neg3(self.col, self.inset)
+        return 4 * self.col + 4
 
+    # Rows go along the negative y axis, which is applied when coordinates are calculated
     def viy0(self):
-        # return self.row
-        return self.neg0(self.row, self.inset)
+        return 4 * self.row
 
     def viy1(self):
-        # return self.row + self.inset
-        return self.neg1(self.row, self.inset)
+        return 4 * self.row + (1 if self.inset else 0)
 
     def viy2(self):
-        # return self.row + 1 - self.inset
-        return self.neg2(self.row, self.inset)
+        return 4 * self.row + (2 if self.inset else 4)
 
     def viy3(self):
-        # return self.row + 1
-        return self.neg3(self.row, self.inset)
+        return 4 * self.row + 4
 
     def viz0(self):
-        return self.level
+        return 4 * self.level
 
     def viz1(self):
-        return self.level + self.inset
+        return 4 * self.level + (1 if self.inset else 0)
 
     def viz2(self):
-        return self.level + 1 - self.inset
+        return 4 * self.level + (2 if self.inset else 4)
 
     def viz3(self):
-        return self.level + 1
+        return 4 * self.level + 4
 
     def vx_left_inner(self):
         return self.vix1()
@@ -247,18 +263,6 @@ class RectCell3d(RectCell):
     def vz_bottom_outer(self):
         return self.viz0()
 
-    def neg0(self, loc, inset=0):
-        return 0 - loc
-
-    def neg1(self, loc, inset=0):
-        return 0 - loc - self.inset
-
-    def neg2(self, loc, inset=0):
-        return 0 - loc - 1 + inset
-
-    def neg3(self, loc, inset=0):
-        return 0 - loc - 1
-
     # Face methods (that reference verticies in a list by their index position, which is found via dicitonary)
 
     def face_below(self, vdict):
@@ -6,10 +6,10 @@ Based on: https://blender.stackexchange.com/a/168967
   and which was based on: https://blender.stackexchange.com/a/82489
     which can also be found at: http://web.purplefrog.com/%7Ethoth/blender/python-cookbook/mobius-strip.html
 '''
-import bpy
+import numpy as np
 from math import *
-from mathutils import *
-from .maze2d import RectGrid
+from .maze2d import RectGrid, NORTH, EAST
+from .utils.transform import rotation_matrix
 
 stop_row = -1
 
@@ -26,21 +26,20 @@ class Mobius(RectGrid):
     col_below = (255, 98, 0, 255)
     col_above_and_below = (192, 255, 0, 255)
 
-    def __init__(self, rows=54, cols=6, clear=False):
+    def __init__(self, rows=54, cols=6, clear=False, rng=None):
         assert rows % 2 == 0
         # cap = rows*cols
-        super().__init__(rows, cols, clear)
-        last_row = rows - 1
-        for first_col in range(cols):
-            last_col = cols-1-first_col
-            begin = self.get(row=0, col=first_col)
-            end = self.get(row=last_row, col=last_col)
-            begin.north = end.id
-            end.south = begin.id
-            if clear:
-                begin.links = begin.neighbors()
-                end.links = end.neighbors()
-            # connect first column's west neighbor to last column's east, but in reverse order column-wise
+        super().__init__(rows, cols, clear, rng)
+
+    # The first row's north neighbors are the last row's cells, but in reverse order column-wise
+    def new_cell(self, id):
+        cell = super().new_cell(id)
+        last_row = self.rows - 1
+        if cell.row == 0:
+            cell.north = last_row * self.cols + self.cols - 1 - cell.col
+        if cell.row == last_row:
+            cell.south = self.cols - 1 - cell.col
+        return cell
 
 
 # Take a MobiusGrid and produce a 3d mesh
@@ -48,8 +47,17 @@ class Mobius(RectGrid):
 #   begin at 0 and rows/2 in order to add both sides in one step.
 
 
-def mobius_maze_mesh(grid, major_radius=5, minor_radius=1, thick=0.1, height=0.25, validate=True, smooth=False):
-    # resolution must be an odd number because there are an even number of faces on the mesh
+def mobius_maze_model(grid, major_radius=5, minor_radius=1, thick=0.1, height=0.25):
+    verts, faces = mobius_maze_model_arrays(grid, major_radius=major_radius,
+                                            minor_radius=minor_radius, thick=thick, height=height)
+    return (verts.tolist(), faces.tolist())
+
+
+# Same as `mobius_maze_model()` but returns numpy arrays of verticies and quads.
+#   Every row step's verticies come from one local lattice (the strip's cross section)
+#   rotated by that step's phi and theta rotations, and the conditional walls are picked
+#   from every possible face with masks built from the grid's link bits.
+def mobius_maze_model_arrays(grid, major_radius=5, minor_radius=1, thick=0.1, height=0.25):
     rows = grid.rows
     cols = grid.cols
     assert rows % 2 == 0
@@ -59,170 +67,125 @@ def mobius_maze_mesh(grid, major_radius=5, minor_radius=1, thick=0.1, height=0.2
     half = int(rows / 2)
     resolution = half
     w = minor_radius * 2 / cols
-    c1 = Vector([major_radius, 0, 0])
-    verts = []
-    faces = []
-    # number of wall verticies added for each loop iteration (outer floor, outer ceiling, inner floor, inner ceiling)
+    c1 = np.array([major_radius, 0, 0])
+    # number of wall verticies added for each column (outer floor, outer ceiling, inner floor, inner ceiling)
     col_verts = 4
-
-    # Each loop iteration step generates two rows of the maze (one on the front of the strip and one on the back)
-    #   Moves in a counter-clockwise direction starting at (major_radius, 0, 0) in the 3d coordinate space
-    for i in range(resolution):
-        row0 = i
-        row1 = half + i
-        not_at_last_row = i+1 < resolution
-
-        # See also: Spherical Coordinate System
-        #   https://en.wikipedia.org/wiki/Spherical_coordinate_system
-        theta = 2*pi * i/resolution  # Theta goes along major radius
-        phi = pi * i/resolution     # Phi goes along minor radius
-        # Rotates along major radius
-        rot_theta = Matrix.Rotation(theta, 3, [0, 0, 1])
-        # Rotates along minor radius
-        rot_phi = Matrix.Rotation(phi, 3, [0, 1, 0])
-
-        # Verticies for external wall floors
-        # Inner base top vert
-        v0 = apply(rot_theta, c1 + apply(rot_phi,
-                   Vector((-thick / 2, 0, minor_radius))))
-        # Outer base top vert
-        v1 = apply(
-            rot_theta, (c1 + apply(rot_phi, Vector((thick / 2, 0, minor_radius)))))
-        # Outer base bottom vert
-        v2 = apply(
-            rot_theta, (c1 + apply(rot_phi, Vector((thick / 2, 0, -minor_radius)))))
-        # Inner base bottom vert
-        v3 = apply(
-            rot_theta, (c1 + apply(rot_phi, Vector((-thick / 2, 0, -minor_radius)))))
-        # Verticies for external wall ceilings
-        # Add external wall vert starting at inner top and ending at outer bottom - uses v1
-        v4 = apply(rot_theta, (c1 + apply(rot_phi,
-                   Vector((-thick / 2 - height, 0, minor_radius)))))
-        # Add wall vert starting at outer top and ending at inner bottom - uses v2
-        v5 = apply(
-            rot_theta, (c1 + apply(rot_phi, Vector((thick / 2 + height, 0, minor_radius)))))
-        # Add wall vert starting at outer bottom and ending at inner top - uses v3
-        v6 = apply(rot_theta, (c1 + apply(rot_phi,
-                   Vector((thick / 2 + height, 0, -minor_radius)))))
-        # Add wall vert starting at inner bottom and ending at outer top - uses v4
-        v7 = apply(rot_theta, (c1 + apply(rot_phi,
-                   Vector((-thick / 2 - height, 0, -minor_radius)))))
-        idx = len(verts)
-        new_verts = [v0, v1, v2, v3, v4, v5, v6, v7]
-        # number of verticies in the base of the mobius strip (excluding walls)
-        base = len(new_verts)
-
-        # Add verticies for internal walls
-        for col in range(1, cols):
-            offset = w * col
-            # outer floors
-            cv0 = apply(rot_theta, (c1 + apply(rot_phi,
-                        Vector((-thick / 2, 0, minor_radius - offset)))))
-            cv1 = apply(rot_theta, (c1 + apply(rot_phi, Vector((-thick /
-                        2 - height, 0, minor_radius - offset)))))   # outer ceilings
-            # inner floor
-            cv2 = apply(
-                rot_theta, (c1 + apply(rot_phi, Vector((thick / 2, 0, minor_radius - offset)))))
-            cv3 = apply(rot_theta, (c1 + apply(rot_phi, Vector((thick /
-                        2 + height, 0, minor_radius - offset)))))    # inner ceilings
-            new_verts.extend([cv0, cv1, cv2, cv3])
-        num = len(new_verts)    # total number of new verticies to add
-        verts.extend(new_verts)
-
-        # Find index positions of the new verts in the `verts[]` list
-        i0 = idx+num+0 if not_at_last_row else 2
-        i1 = idx+num+1 if not_at_last_row else 3
-        i2 = idx+num+2 if not_at_last_row else 0
-        i3 = idx+num+3 if not_at_last_row else 1
-        i4 = idx+num+4 if not_at_last_row else 6
-        i5 = idx+num+5 if not_at_last_row else 7
-        i6 = idx+num+6 if not_at_last_row else 4
-        i7 = idx+num+7 if not_at_last_row else 5
-
-        # Add faces that are always rendered
-        faces.append([idx+0, idx+1, i1, i0])  # base - edge thickness face top
-        faces.append([idx+1, idx+2, i2, i1])  # base - outer face
-        # base - edge thickness face bottom
-        faces.append([idx+2, idx+3, i3, i2])
-        faces.append([idx+3, idx+0, i0, i3])  # base - inner face
-        faces.append([idx+5, idx+1, i1, i5])  # exterior wall - top outer
-        faces.append([idx+6, idx+2, i2, i6])  # exterior wall - bottom outer
-        faces.append([idx+0, idx+4, i4, i0])  # exterior wall - top inner
-        faces.append([idx+3, idx+7, i7, i3])  # exterior wall - bottom inner
-
-        # Conditional wall faces
-        cn = idx + num - col_verts
-        if i == stop_row:
-            # iterate outer cells in reverse column order
-            outer_cell = grid.get(row=row0, col=cols-1)
-            inner_cell = grid.get(row=row1, col=0)
-            continue
-        for col in range(cols):
-            col_offset = col * col_verts
-            c0 = ((cols-col) * col_verts)
-            cv0 = idx + base + ((col-1)*col_verts)  # next column offset
-            c = idx + base + col_offset             # current row offset
-            n = idx + base + col_offset + num       # next row offset
-            match col:
-                case 0:
-                    outer_next_row = [idx+1, idx+5, idx+base+3, idx+base+2]
-                    inner_next_row = [idx+0, idx+4, idx+base+1, idx+base+0]
-                case x if x == cols-1:
-                    outer_next_row = [idx+2, idx+6, cn+3, cn+2]
-                    inner_next_row = [idx+3, idx+7, cn+1, cn+0]
-                case _:
-                    outer_next_row = [cv0+2, cv0+3, c+3, c+2]
-                    inner_next_row = [cv0+0, cv0+1, c+1, c+0]
-            match not_at_last_row:
-                case True:
-                    outer_next_col = [c+3, c+2, n+2, n+3]
-                    inner_next_col = [c+1, c+0, n+0, n+1]
-                case False:
-                    outer_next_col = [c0+0, c0+1, c+3, c+2]
-                    inner_next_col = [c0+3, c0+2, c+0, c+1]
-            # iterate outer cells in reverse column order
-            outer_cell = grid.get(row=row0, col=cols-1-col)
-            inner_cell = grid.get(row=row1, col=col)
-            if not outer_cell.linked_north():
-                faces.append(outer_next_row)
-            if not inner_cell.linked_north():
-                faces.append(inner_next_row)
-            if col != cols-1:
-                outer_cell = grid.get(row=row0, col=cols-1-col-1)
-                if not outer_cell.linked_east():
-                    faces.append(outer_next_col)
-                if not inner_cell.linked_east():
-                    faces.append(inner_next_col)
-
-    mesh = bpy.data.meshes.new("mobius")
-    mesh.from_pydata(verts, [], faces)
-    if validate:
-        if mesh.validate():
-            print('Invalid mesh')
-            return
+    base = 8
+    num = base + (cols - 1) * col_verts
+
+    # Cross section of the strip before rotating: the external wall floors and ceilings
+    #   (inner top, outer top, outer bottom, inner bottom) followed by the internal walls
+    offsets = minor_radius - w * np.arange(1, cols)
+    lattice = np.empty((num, 3))
+    lattice[:base] = [
+        (-thick / 2, 0, minor_radius),
+        (thick / 2, 0, minor_radius),
+        (thick / 2, 0, -minor_radius),
+        (-thick / 2, 0, -minor_radius),
+        (-thick / 2 - height, 0, minor_radius),
+        (thick / 2 + height, 0, minor_radius),
+        (thick / 2 + height, 0, -minor_radius),
+        (-thick / 2 - height, 0, -minor_radius),
+    ]
+    walls = lattice[base:].reshape(cols - 1, col_verts, 3)
+    walls[:, :, 1] = 0
+    walls[:, :, 2] = offsets[:, None]
+    walls[:, :, 0] = [-thick / 2, -thick / 2 - height, thick / 2, thick / 2 + height]
+
+    # See also: Spherical Coordinate System
+    #   https://en.wikipedia.org/wiki/Spherical_coordinate_system
+    steps = np.arange(resolution)
+    rot_theta = rotation_matrix(2*pi * steps/resolution, [0, 0, 1])  # along major radius
+    rot_phi = rotation_matrix(pi * steps/resolution, [0, 1, 0])      # along minor radius
+    verts = np.einsum('rij,rkj->rki', rot_theta,
+                      c1 + np.einsum('rij,kj->rki', rot_phi, lattice))
+    verts = verts.reshape(-1, 3)
+
+    # Index positions of each step's verts (`idx`) and of the next step's verts (`nxt`);
+    #   the last step joins back to the first with the strip flipped over
+    idx = (steps * num)[:, None]
+    nxt = idx + num + np.arange(base)
+    nxt[-1] = [2, 3, 0, 1, 6, 7, 4, 5]
+    i0, i1, i2, i3, i4, i5, i6, i7 = (nxt[:, k] for k in range(base))
+
+    # Faces that are always rendered
+    fixed = np.stack([
+        np.stack([idx[:, 0]+0, idx[:, 0]+1, i1, i0], axis=1),  # base - edge thickness face top
+        np.stack([idx[:, 0]+1, idx[:, 0]+2, i2, i1], axis=1),  # base - outer face
+        np.stack([idx[:, 0]+2, idx[:, 0]+3, i3, i2], axis=1),  # base - edge thickness face bottom
+        np.stack([idx[:, 0]+3, idx[:, 0]+0, i0, i3], axis=1),  # base - inner face
+        np.stack([idx[:, 0]+5, idx[:, 0]+1, i1, i5], axis=1),  # exterior wall - top outer
+        np.stack([idx[:, 0]+6, idx[:, 0]+2, i2, i6], axis=1),  # exterior wall - bottom outer
+        np.stack([idx[:, 0]+0, idx[:, 0]+4, i4, i0], axis=1),  # exterior wall - top inner
+        np.stack([idx[:, 0]+3, idx[:, 0]+7, i7, i3], axis=1),  # exterior wall - bottom inner
+    ], axis=1)
+
+    # Conditional wall faces, for each step and column:
+    #   outer north, inner north, outer east, inner east
+    col = np.arange(cols)
+    c = idx + base + col * col_verts    # current column
+    cv = c - col_verts                  # previous column
+    n = c + num                         # same column on the next step
+    cn = idx + num - col_verts          # last internal wall
+    c0 = np.broadcast_to((cols - col) * col_verts, c.shape)
+    first = col == 0
+    last = col == cols - 1
+    outer_next_row = np.stack([
+        np.where(first, idx+1, np.where(last, idx+2, cv+2)),
+        np.where(first, idx+5, np.where(last, idx+6, cv+3)),
+        np.where(last, cn+3, c+3),
+        np.where(last, cn+2, c+2),
+    ], axis=-1)
+    inner_next_row = np.stack([
+        np.where(first, idx+0, np.where(last, idx+3, cv+0)),
+        np.where(first, idx+4, np.where(last, idx+7, cv+1)),
+        np.where(last, cn+1, c+1),
+        np.where(last, cn+0, c+0),
+    ], axis=-1)
+    outer_next_col = np.stack([c+3, c+2, n+2, n+3], axis=-1)
+    inner_next_col = np.stack([c+1, c+0, n+0, n+1], axis=-1)
+    outer_next_col[-1] = np.stack([c0[-1]+0, c0[-1]+1, c[-1]+3, c[-1]+2], axis=-1)
+    inner_next_col[-1] = np.stack([c0[-1]+3, c0[-1]+2, c[-1]+0, c[-1]+1], axis=-1)
+    walls = np.stack([outer_next_row, inner_next_row, outer_next_col, inner_next_col], axis=2)
+
+    # Outer cells are iterated in reverse column order on the first half of the rows,
+    #   inner cells in column order on the second half
+    bits = np.frombuffer(grid.link_bits, dtype=np.uint8).reshape(rows, cols)
+    outer = bits[:half, ::-1]
+    inner = bits[half:]
+    keep = np.zeros((resolution, cols, 4), dtype=bool)
+    keep[:, :, 0] = outer & NORTH == 0
+    keep[:, :, 1] = inner & NORTH == 0
+    keep[:, :-1, 2] = outer[:, 1:] & EAST == 0
+    keep[:, :-1, 3] = inner[:, :-1] & EAST == 0
+    if 0 <= stop_row < resolution:
+        keep[stop_row] = False
+
+    faces = np.concatenate([fixed, walls.reshape(resolution, -1, 4)], axis=1)
+    keep = np.concatenate([np.ones((resolution, base), dtype=bool), keep.reshape(resolution, -1)], axis=1)
+    return (verts, faces[keep])
+
+
+# `model` is an already generated (verts, faces), such as from a cache
+def mobius_maze_mesh(grid, major_radius=5, minor_radius=1, thick=0.1, height=0.25, validate=True, smooth=False, model=None):
+    if model == None:
+        verts, faces = mobius_maze_model_arrays(grid, major_radius=major_radius,
+                                                minor_radius=minor_radius, thick=thick, height=height)
+    else:
+        verts, faces = model
+    from .utils.blender import create_mesh, set_smooth
+    mesh = create_mesh("mobius", verts, [], faces, validate)
+    if mesh == None:
+        return
 
     if smooth:
-        for p in mesh.polygons:
-            p.use_smooth = True
+        set_smooth(mesh)
 
     return mesh
 
 
-def apply(matrix, vector):
-    '''
-    apply(matrix, vector) -> vector
-
-    this function receives a matrix and a vector and returns
-    the vector obtained by multipling both of them
-    '''
-    V_0 = vector @ matrix[0]
-    V_1 = vector @ matrix[1]
-    V_2 = vector @ matrix[2]
-    return Vector((V_0, V_1, V_2))
-
-
-def create_mobius_strip(grid, rows, cols, major_radius=5, minor_radius=1, thick=0.1, height=0.25, validate=True, smooth=False):
+def create_mobius_strip(grid, rows, cols, major_radius=5, minor_radius=1, thick=0.1, height=0.25, validate=True, smooth=False, model=None):
     me = mobius_maze_mesh(grid, major_radius=major_radius,
-                          minor_radius=minor_radius, thick=thick, height=height, validate=validate)
-    ob = bpy.data.objects.new("Mobius Mesh", me)
-    bpy.context.collection.objects.link(ob)
+                          minor_radius=minor_radius, thick=thick, height=height, validate=validate, smooth=smooth, model=model)
+    from .utils.blender import attach_mesh
+    attach_mesh("Mobius Mesh", me)
@@ -1,25 +1,26 @@
-import bpy
+import numpy as np
 
 from .maze2d import RectGrid
 from .maze3d import RectCell3d, VertState
-from .cube import Cube, center_maze
+from .cube import Cube, center_matrix
+from .raster import save_atlas, save_levels, cube_net
+from .utils.export import concat_meshes, weld_verts
 from .utils.transform import *
-from .utils.blender import new_mesh_obj, join_meshes
-
-from PIL import ImageFont
 
 
 class CubeCell(RectCell3d):
-    def __init__(self, grid, id, row, col, level, weight=1, clear=False):
+    __slots__ = ()
+
+    def __init__(self, grid, id, row, col, level):
+        self.grid = grid
         self.id = id
         self.row = row
         self.col = col
         self.level = level
-        self.weight = weight
+        self.inset = grid.inset
+        self.above = None
+        self.below = None
         self.calc_neighbors(grid)
-        self.links = [] if not clear else list[filter(
-            lambda d: d != None, [self.north, self.east, self.south, self.west])]
-        pass
 
     def calc_neighbors(self, grid):
         n = self.id - grid.cols
@@ -116,17 +117,15 @@ class OuterCube(Cube):
     col_below = (255, 98, 0, 255)
     col_above_and_below = (192, 255, 0, 255)
 
-    def __init__(self, rows=10, cols=10, weight=1, masked=False, clear=False):
+    def __init__(self, rows=10, cols=10, weight=1, masked=False, clear=False, rng=None):
         assert rows == cols
         self.levels = 6
-        super().__init__(rows, cols, self.levels, weight, masked, clear, inset=0)
-        self.cells = []
-        for level in range(6):
-            for row in range(rows):
-                for col in range(cols):
-                    id = self.calc_id(level, row, col)
-                    self.cells.append(
-                        CubeCell(self, id, row, col, level, weight, clear))
+        super().__init__(rows, cols, self.levels, weight,
+                         masked, clear, inset=0, rng=rng)
+
+    def new_cell(self, id):
+        level, i = divmod(id, self.cap2d)
+        return CubeCell(self, id, i // self.cols, i % self.cols, level)
 
     def calc_id(self, level, row, col):
         return self.rows * self.cols * level + row * self.cols + col
@@ -140,18 +139,15 @@ class OuterCube(Cube):
     def get(self, level, row, col):
         return self.cells[level*self.rows*self.cols + row * self.cols + col]
 
-    def render2d(self, filename, block_size=70, frame_size=10, border_color=col_border, block_color=col_block, grid_bg=col_grid, text_color=col_text, show_labels=True, font=ImageFont.truetype("assets/DejaVuSansMono.ttf", 12)):
-        cap = self.rows * self.cols
-        for level in range(self.levels):
-            parts = filename.rpartition(".")
-            file = f'{parts[0]}_{level}{parts[1]}{parts[2]}'
-            cells = self.cells[level*cap:level*cap+cap]
-
-            custom_bgs = {}
-            custom_text = {}
-
-            RectGrid.render2d(self, file, block_size, frame_size, border_color,
-                              block_color, grid_bg, text_color, show_labels, font, cells, custom_bgs, custom_text)
+    # Draws every face as separate PNGs, or with `atlas` as the cube's unfolded net in one PNG
+    def render2d(self, filename, block_size=70, frame_size=10, border_color=col_border, block_color=col_block, grid_bg=col_grid, text_color=col_text, show_labels=True, font=None, compact=False, atlas=False, workers=0, compress_level=6):
+        jobs = [self.level_job(level, block_size, frame_size, border_color, block_color, grid_bg,
+                               text_color, show_labels, font, {}, {}, compact)
+                for level in range(self.levels)]
+        if atlas:
+            save_atlas(filename, jobs, cube_net, workers, compress_level)
+        else:
+            save_levels(filename, jobs, workers, compress_level)
 
     def split_cube(self, inset=0.25):
         if inset < 0.05:
@@ -175,7 +171,7 @@ class OuterCubePlane(Cube):
 
     def generate_cube_face(self, show_outer_faces=False):
         # NOTE: show_outer_faces is ignored if `inset == 0`
-        state = VertState()
+        state = VertState(self.rows, self.cols, self.levels, self.inset)
         faces = []
 
         if self.inset != 0:
@@ -202,7 +198,8 @@ class OuterCubePlane(Cube):
         return (state.verts, faces)
 
 
-def create_outer_cube(cube: OuterCube, name="outer_cubic_maze", show_outer_faces=False, joined=True, inner_cube=True, inset=0.0):
+# Yields (verts, faces) for each face of the cube, already centered and oriented
+def outer_cube_faces(cube: OuterCube, show_outer_faces=False, inset=0.0):
     grids = cube.split_cube(inset)
     assert len(grids) == 6
     assert grids[0].rows == grids[1].cols
@@ -210,26 +207,53 @@ def create_outer_cube(cube: OuterCube, name="outer_cubic_maze", show_outer_faces
         assert grids[i].rows == grids[i+1].rows
         assert grids[i].cols == grids[i+1].cols
 
-    rows = grids[0].rows
-    cols = grids[0].cols
-    midx = cols / 2
-    midy = rows / 2
-
-    objs = []
-
     for i, grid in enumerate(grids):
         verts, faces = grid.generate_cube_face(show_outer_faces)
-        verts = center_maze(grid, verts)
-        verts = grid.reorient_cube_face(i, verts)
+        verts = transform(compose(center_matrix(grid), grid.face_matrix(i)), verts)
+        yield (verts, faces)
+
+
+# Returns (verts, faces) arrays for the whole cube as one mesh: the six faces are
+#   concatenated and the duplicate verticies along their seams are welded
+def outer_cube_model(cube: OuterCube, show_outer_faces=False, inset=0.0, inner_cube=False):
+    verts, faces = concat_meshes(outer_cube_faces(cube, show_outer_faces, inset))
+    verts, faces = weld_verts(verts, np.array(list(faces)).reshape(-1, 4))
+    if inner_cube:
+        verts, faces = add_inner_cube(verts, faces, cube.rows)
+    return (verts, faces)
+
+
+# Appends a cube with sides of length `size` centered on (0, 0, 0), in place of
+#   bpy.ops.mesh.primitive_cube_add(size=size)
+def add_inner_cube(verts, faces, size):
+    h = size / 2
+    corners = np.array([(x, y, z) for x in (-h, h) for y in (-h, h) for z in (-h, h)])
+    sides = np.array([
+        (0, 1, 3, 2), (4, 6, 7, 5),  # -x, +x
+        (0, 4, 5, 1), (2, 3, 7, 6),  # -y, +y
+        (0, 2, 6, 4), (1, 5, 7, 3),  # -z, +z
+    ])
+    return (np.concatenate([verts, corners]), np.concatenate([faces, sides + len(verts)]))
+
+
+# `model` is the (verts, faces) of all six faces together, such as from a cache.
+#   When `joined` the cube is built as a single mesh, otherwise as one object per face.
+def create_outer_cube(cube: OuterCube, name="outer_cubic_maze", show_outer_faces=False, joined=True, inner_cube=True, inset=0.0, model=None):
+    from .utils.blender import new_mesh_obj, add_cube
+    if joined or model != None:
+        if model == None:
+            verts, faces = outer_cube_model(cube, show_outer_faces, inset)
+        else:
+            verts, faces = model
+        if inner_cube:
+            verts, faces = add_inner_cube(verts, faces, cube.rows)
+        obj = new_mesh_obj(name, verts=verts, faces=faces)
+        return obj if joined else [obj]
+
+    objs = []
+    for i, (verts, faces) in enumerate(outer_cube_faces(cube, show_outer_faces, inset)):
         mesh = new_mesh_obj(name+'__face_'+str(i), verts=verts, faces=faces)
         objs.append(mesh)
     if inner_cube:
-        bpy.ops.mesh.primitive_cube_add(size=grids[0].rows)
-        cube = bpy.context.selected_objects[0]
-        cube.name = name + '__inner_cube'
-        objs.append(cube)
-    if not joined:
-        return objs
-    else:
-        join_meshes(objs)
-        return
+        objs.append(add_cube(name + '__inner_cube', cube.rows))
+    return objs
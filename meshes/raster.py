@@ -0,0 +1,196 @@
+from concurrent.futures import ProcessPoolExecutor
+from math import ceil, sqrt
+
+import numpy as np
+
+from .maze2d import NORTH, EAST, SOUTH, WEST, load_font
+
+# Maze images drawn into numpy RGBA buffers, for `RectGrid.render2d()`.
+#   Pillow is only needed to add labels and to encode the image.
+#
+# Levels are described by jobs (see `RectGrid.level_job()`), which can be drawn in other
+#   processes and saved as separate images or tiled into one atlas image.
+
+# Where each face of an `OuterCube` goes in its unfolded net, as (row, col) tiles.
+#   Faces 0-3 wrap around the cube, with face 4 above and face 5 below face 1.
+cube_net = [(1, 0), (1, 1), (1, 2), (1, 3), (0, 1), (2, 1)]
+
+
+# Tiles in rows of `columns` levels (about square by default)
+def grid_layout(levels, columns=None):
+    if columns == None:
+        columns = ceil(sqrt(levels))
+    return [divmod(level, columns) for level in range(levels)]
+
+
+# Draws one level.  Returns a (height, width, 4) uint8 array.
+def level_image(job):
+    bits, rows, cols = job['link_bits'], job['rows'], job['cols']
+    if job['compact']:
+        return compact_image(bits, rows, cols, job['border_color'], job['block_color'], job['bgs'])
+    img = wall_image(bits, rows, cols, job['block_size'], job['frame_size'], job['border_color'],
+                     job['block_color'], job['grid_bg'], job['bgs'])
+    if job['labels'] != None:
+        from PIL import Image
+        img = Image.fromarray(img, 'RGBA')
+        font = job['font'] if job['font'] != None else load_font()
+        draw_labels(img, job['labels'], label_centers(rows, cols, job['block_size'], job['frame_size']),
+                    font, job['text_color'])
+        img = np.asarray(img)
+    return img
+
+
+# Draws a level and saves it if the job has a `filename`, otherwise returns the image
+def render_job(job):
+    img = level_image(job)
+    if job.get('filename') == None:
+        return img
+    save_png(job['filename'], img, job.get('compress_level', 6))
+
+
+def save_png(filename, img, compress_level=6):
+    from PIL import Image
+    Image.fromarray(img, 'RGBA').save(
+        filename, "PNG", compress_level=compress_level)
+
+
+# Runs jobs across `workers` processes (all cores if None, or in this process if 0)
+def render_jobs(jobs, workers=0):
+    if workers == 0:
+        return list(map(render_job, jobs))
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(render_job, jobs))
+
+
+# Saves every level as its own PNG, named like `maze_0.png`, `maze_1.png` for `maze.png`
+def save_levels(filename, jobs, workers=0, compress_level=6):
+    parts = filename.rpartition(".")
+    render_jobs([{**job, 'filename': f'{parts[0]}_{level}{parts[1]}{parts[2]}', 'compress_level': compress_level}
+                 for level, job in enumerate(jobs)], workers)
+
+
+# Saves every level in one PNG, with level i at tile layout[i] = (row, col)
+def save_atlas(filename, jobs, layout, workers=0, compress_level=6):
+    save_png(filename, atlas(render_jobs(jobs, workers), layout), compress_level)
+
+
+def atlas(tiles, layout):
+    height = max(tile.shape[0] for tile in tiles)
+    width = max(tile.shape[1] for tile in tiles)
+    rows = max(row for row, col in layout) + 1
+    cols = max(col for row, col in layout) + 1
+    img = np.zeros((rows * height, cols * width, 4), dtype=np.uint8)
+    for tile, (row, col) in zip(tiles, layout):
+        img[row*height:row*height + tile.shape[0],
+            col*width:col*width + tile.shape[1]] = tile
+    return img
+
+
+# Image of one level of a grid with `block_size` pixels per cell, drawn the same way as
+#   the per-cell Pillow version: a `grid_bg` frame with `block_color` cells and
+#   one pixel wide walls.  `bgs` maps cell offsets (within `link_bits`) to colors.
+#   Returns a (height, width, 4) uint8 array.
+def wall_image(link_bits, rows, cols, block_size, frame_size, border_color, block_color, grid_bg, bgs={}):
+    bits = np.frombuffer(link_bits, dtype=np.uint8).reshape(rows, cols)
+    width = cols * block_size + frame_size * 2
+    height = rows * block_size + frame_size * 2
+    img = np.zeros((height + 1, width + 1, 4), dtype=np.uint8)
+    # whole pixels at a time
+    px = img.view(np.uint32)[:, :, 0]
+    px[frame_size:height-frame_size+1, frame_size:width-frame_size+1] = pixel(grid_bg)
+
+    # cell interiors
+    size = rows * block_size
+    inner = px[frame_size:frame_size + size, frame_size:frame_size + cols*block_size]
+    inner = inner.reshape(rows, block_size, cols, block_size)
+    if block_size > 1:
+        inner[:, 1:, :, 1:] = pixel(block_color)
+        for id, color in bgs.items():
+            inner[id // cols, 1:, id % cols, 1:] = pixel(color)
+
+    # Walls are drawn from corner to corner, including both corners.  Each wall line
+    #   (rows + 1 horizontal, cols + 1 vertical) is masked one pixel at a time along it.
+    border = pixel(border_color)
+    lines = px[frame_size:frame_size + size + 1:block_size, frame_size:frame_size + cols*block_size + 1]
+    lines[wall_mask(bits & NORTH == 0, bits & SOUTH == 0, block_size)] = border
+    lines = px[frame_size:frame_size + size + 1, frame_size:frame_size + cols*block_size + 1:block_size]
+    lines[wall_mask(bits.T & WEST == 0, bits.T & EAST == 0, block_size).T] = border
+    return img
+
+
+# Pixels along each wall line, given the walls on the near and far side of every cell
+#   (for example north and south walls).  Returns a (lines + 1, cells * block_size + 1) mask.
+def wall_mask(near, far, block_size):
+    lines, cells = near.shape
+    walls = np.zeros((lines + 1, cells), dtype=bool)
+    walls[:-1] |= near
+    walls[1:] |= far
+    mask = np.zeros((lines + 1, cells * block_size + 1), dtype=bool)
+    mask[:, :-1] = np.repeat(walls, block_size, axis=1)
+    # the far corner of each wall
+    mask[:, block_size::block_size] |= walls
+    return mask
+
+
+# A color as one uint32 pixel of an RGBA uint8 image
+def pixel(color):
+    return np.array(color, dtype=np.uint8).view(np.uint32)[0]
+
+
+# Preview image with one pixel per cell, wall and corner: cell (row, col) is pixel
+#   (2*row + 1, 2*col + 1) and the pixels between cells are walls or passages.
+#   Returns a (2*rows + 1, 2*cols + 1, 4) uint8 array.
+def compact_image(link_bits, rows, cols, border_color, block_color, bgs={}):
+    bits = np.frombuffer(link_bits, dtype=np.uint8).reshape(rows, cols)
+    img = np.empty((2*rows + 1, 2*cols + 1, 4), dtype=np.uint8)
+    img[:] = border_color
+    cells = img[1::2, 1::2]
+    cells[:] = block_color
+    for id, color in bgs.items():
+        cells[id // cols, id % cols] = color
+    open = np.array(block_color, dtype=np.uint8)
+    img[0:-1:2, 1::2][bits & NORTH != 0] = open
+    img[2::2, 1::2][bits & SOUTH != 0] = open
+    img[1::2, 0:-1:2][bits & WEST != 0] = open
+    img[1::2, 2::2][bits & EAST != 0] = open
+    return img
+
+
+def label_centers(rows, cols, block_size, frame_size):
+    half = block_size / 2
+    return ((frame_size + col * block_size + half, frame_size + row * block_size + half)
+            for row in range(rows) for col in range(cols))
+
+
+# Draws every label onto a Pillow image at once.  Each character is rendered once and
+#   copied into a single coverage mask, which is then blended into the image with
+#   `color`.  Labels are centered on their (x, y) position, like `anchor='mm'`.
+def draw_labels(img, labels, centers, font, color):
+    from PIL import Image, ImageDraw
+    width, height = img.size
+    alpha = np.zeros((height, width), dtype=np.uint8)
+    ascent, descent = font.getmetrics()
+    middle = (ascent - descent) / 2
+    glyphs = {}
+    for text, (cx, cy) in zip(labels, centers):
+        x = cx - font.getlength(text) / 2
+        y = cy + middle
+        for ch in text:
+            glyph = glyphs.get(ch)
+            if glyph == None:
+                left, top, right, bottom = font.getbbox(ch, anchor='ls')
+                mask = Image.new('L', (max(right - left, 1), max(bottom - top, 1)))
+                ImageDraw.Draw(mask).text((-left, -top), ch,
+                                          fill=255, font=font, anchor='ls')
+                glyph = (np.asarray(mask), left, top, font.getlength(ch))
+                glyphs[ch] = glyph
+            mask, left, top, advance = glyph
+            gx = round(x) + left
+            gy = round(y) + top
+            x += advance
+            x0, y0 = max(gx, 0), max(gy, 0)
+            x1, y1 = min(gx + mask.shape[1], width), min(gy + mask.shape[0], height)
+            if x0 < x1 and y0 < y1:
+                region = alpha[y0:y1, x0:x1]
+                np.maximum(region, mask[y0-gy:y1-gy, x0-gx:x1-gx], out=region)
+    img.paste(Image.new(img.mode, img.size, color), mask=Image.fromarray(alpha, 'L'))
@@ -0,0 +1,135 @@
+import lzma
+import struct
+import zlib
+
+import numpy as np
+
+from .maze2d import RectGrid, Cylinder
+from .cube import Cube
+from .outer_cube import OuterCube
+from .mobius import Mobius
+from .grid_edges import grid_edges
+
+# Compact maze files.
+#
+# A fixed size header is followed by one bit per passage the grid could have, in the
+#   order `grid_edges()` lists them (about 2 bits per cell for flat grids and 3 for
+#   cubes).  Uncompressed files are read with a memory map, and the bits are unpacked
+#   straight into `grid.link_bits` without creating any cells.
+#
+# Header (little endian):
+#   magic         4 bytes, b'MAZE'
+#   version       u8
+#   type          u8, index into `grid_types`
+#   compression   u8, index into `compressions`
+#   flags         u8, 1 if a seed is stored, 2 if the seed is negative
+#   rows, cols, levels    u32 each
+#   inset         f64
+#   seed          u64, the seed's absolute value (version 1 files stored it as an i64)
+#   edges         u64, number of bits
+#   size          u64, payload size in bytes
+
+magic = b'MAZE'
+version = 2
+header = struct.Struct('<4sBBBBIIIdQQQ')
+has_seed = 1
+negative_seed = 2
+
+grid_types = [RectGrid, Cylinder, Cube, OuterCube, Mobius]
+compressions = [None, 'zlib', 'lzma']
+
+
+# Saves `grid` to `filename`.  `compression` can be None, 'zlib' or 'lzma'.
+def save_maze(filename, grid, seed=None, compression=None):
+    if type(grid) not in grid_types:
+        raise ValueError(f'Unsupported grid type: {type(grid).__name__}')
+    if seed != None and not (isinstance(seed, int) and abs(seed) < 2**64):
+        raise ValueError(f'Seeds must be integers with an absolute value below 2**64: {seed!r}')
+    flags = 0
+    if seed != None:
+        flags = has_seed | (negative_seed if seed < 0 else 0)
+    count, payload = pack_links(grid)
+    match compression:
+        case None: pass
+        case 'zlib': payload = zlib.compress(payload, 9)
+        case 'lzma': payload = lzma.compress(payload)
+        case _: raise ValueError(f'Unsupported compression: {compression}')
+    head = header.pack(magic, version, grid_types.index(type(grid)), compressions.index(compression),
+                       flags, grid.rows, grid.cols, getattr(grid, 'levels', 1),
+                       getattr(grid, 'inset', 0), abs(seed) if seed != None else 0, count, len(payload))
+    with open(filename, 'wb') as f:
+        f.write(head)
+        f.write(payload)
+
+
+# Returns the header of a maze file as a dict
+def read_header(filename):
+    with open(filename, 'rb') as f:
+        data = f.read(header.size)
+    if len(data) < header.size or data[:4] != magic:
+        raise ValueError(f'Not a maze file: {filename}')
+    _, file_version, type, compression, flags, rows, cols, levels, inset, seed, edges, size = header.unpack(
+        data)
+    if file_version not in (1, version):
+        raise ValueError(f'Unsupported maze file version: {file_version}')
+    if file_version == 1 and seed >= 2**63:
+        seed -= 2**64
+    if flags & negative_seed:
+        seed = -seed
+    return {
+        'type': grid_types[type],
+        'compression': compressions[compression],
+        'rows': rows,
+        'cols': cols,
+        'levels': levels,
+        'inset': inset,
+        'seed': seed if flags & has_seed else None,
+        'edges': edges,
+        'size': size,
+    }
+
+
+# Returns (grid, seed) for a file written by `save_maze()`
+def load_maze(filename, rng=None):
+    info = read_header(filename)
+    grid = new_grid(info, rng)
+    match info['compression']:
+        case None:
+            if info['size'] == 0:
+                payload = b''
+            else:
+                payload = np.memmap(filename, dtype=np.uint8, mode='r',
+                                    offset=header.size, shape=(info['size'],))
+        case compression:
+            with open(filename, 'rb') as f:
+                f.seek(header.size)
+                payload = f.read(info['size'])
+            payload = zlib.decompress(payload) if compression == 'zlib' else lzma.decompress(payload)
+    unpack_links(grid, payload, info['edges'])
+    return (grid, info['seed'])
+
+
+def new_grid(info, rng=None):
+    rows, cols = info['rows'], info['cols']
+    match info['type'].__name__:
+        case 'Cube': return Cube(rows=rows, cols=cols, levels=info['levels'], inset=info['inset'], rng=rng)
+        case 'OuterCube': return OuterCube(rows=rows, cols=cols, rng=rng)
+        case _: return info['type'](rows=rows, cols=cols, rng=rng)
+
+
+# Returns (number of edges, packed bits) with one bit for each of the grid's edges
+def pack_links(grid):
+    a, b, bit_a, bit_b = grid_edges(grid)
+    bits = np.frombuffer(grid.link_bits, dtype=np.uint8)
+    return (len(a), np.packbits(bits[a] & bit_a != 0).tobytes())
+
+
+# Links every edge whose bit is set in `packed`
+def unpack_links(grid, packed, count):
+    a, b, bit_a, bit_b = grid_edges(grid)
+    if len(a) != count:
+        raise ValueError(f'Expected {len(a)} edges but found {count}')
+    linked = np.unpackbits(np.frombuffer(packed, dtype=np.uint8), count=count).astype(bool)
+    bits = np.frombuffer(grid.link_bits, dtype=np.uint8)
+    np.bitwise_or.at(bits, a[linked], bit_a[linked])
+    np.bitwise_or.at(bits, b[linked], bit_b[linked])
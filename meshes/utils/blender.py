@@ -1,9 +1,10 @@
 import bpy
+import numpy as np
 
 
 def add_mesh(name, verticies, edges=[], faces=[]):
     new_mesh = bpy.data.meshes.new(name)
-    new_mesh.from_pydata(verticies, edges, faces)
+    fill_mesh(new_mesh, verticies, edges, faces)
     if new_mesh.validate():
         print('Invalid mesh')
         return
@@ -16,7 +17,7 @@ def add_mesh(name, verticies, edges=[], faces=[]):
 
 def create_mesh(name, verts=[], edges=[], faces=[], validate=True):
     mesh = bpy.data.meshes.new(name)
-    mesh.from_pydata(verts, edges, faces)
+    fill_mesh(mesh, verts, edges, faces)
     if validate:
         if mesh.validate():
             print('Invalid mesh')
@@ -24,6 +25,47 @@ def create_mesh(name, verts=[], edges=[], faces=[], validate=True):
     return mesh
 
 
+# Numpy arrays of verticies (n, 3) and faces (n, sides) are copied straight into the
+#   mesh with foreach_set; anything else goes through from_pydata
+def fill_mesh(mesh, verts, edges, faces):
+    if not isinstance(verts, np.ndarray) or not isinstance(faces, np.ndarray):
+        mesh.from_pydata(verts, edges, faces)
+        return
+    verts = np.ascontiguousarray(verts, dtype=np.float32).reshape(-1, 3)
+    faces = np.asarray(faces, dtype=np.int32)
+    sizes = np.full(len(faces), faces.shape[1] if faces.ndim == 2 else 0, dtype=np.int32)
+    fill_mesh_loops(mesh, verts, faces.reshape(-1), sizes, edges)
+
+
+# Fills an empty mesh from flat arrays: verticies (n*3 floats), the vertex index of each
+#   loop, and the number of loops in each face
+def fill_mesh_loops(mesh, verts, loops, sizes, edges=[]):
+    verts = np.ascontiguousarray(verts, dtype=np.float32).reshape(-1)
+    loops = np.ascontiguousarray(loops, dtype=np.int32)
+    sizes = np.ascontiguousarray(sizes, dtype=np.int32)
+    starts = np.zeros(len(sizes), dtype=np.int32)
+    np.cumsum(sizes[:-1], out=starts[1:])
+
+    mesh.vertices.add(len(verts) // 3)
+    mesh.vertices.foreach_set('co', verts)
+    if len(edges):
+        edges = np.ascontiguousarray(edges, dtype=np.int32).reshape(-1)
+        mesh.edges.add(len(edges) // 2)
+        mesh.edges.foreach_set('vertices', edges)
+    mesh.loops.add(len(loops))
+    mesh.loops.foreach_set('vertex_index', loops)
+    mesh.polygons.add(len(sizes))
+    mesh.polygons.foreach_set('loop_start', starts)
+    # loop_total is read only from Blender 4.0, where it follows from loop_start
+    if bpy.app.version < (4, 0, 0):
+        mesh.polygons.foreach_set('loop_total', sizes)
+    mesh.update(calc_edges=True)
+
+
+def set_smooth(mesh, smooth=True):
+    mesh.polygons.foreach_set('use_smooth', np.full(len(mesh.polygons), smooth, dtype=bool))
+
+
 def attach_mesh(name, mesh):
     obj = bpy.data.objects.new(name, mesh)
     bpy.context.collection.objects.link(obj)
@@ -38,12 +80,9 @@ def new_mesh_obj(mesh_name, verts, edges=[], faces=[], obj_name=None, validate=T
     return obj
 
 
-def join_meshes(objs: list):
-    ctx = bpy.context.copy()
-    ctx['active_object'] = objs[0]
-    ctx['selected_editable_objects'] = objs
-    result = bpy.ops.object.join(ctx)
-    name = objs[0].name.rsplit('__face_0', 1)
-    name = ''.join(name)
-    objs[0].name = name
-    return result
+def add_cube(name, size):
+    bpy.ops.mesh.primitive_cube_add(size=size)
+    cube = bpy.context.selected_objects[0]
+    cube.name = name
+    return cube
+
@@ -0,0 +1,174 @@
+import struct
+from itertools import islice
+
+import numpy as np
+
+# Mesh export without Blender.
+#   Verticies are written first, then faces are written in chunks as they are read,
+#   so `faces` can be a generator.  Face counts that are needed in file headers are
+#   filled in after the last face has been written.
+
+chunk_size = 65536
+
+
+def export_mesh(filename, verts, faces):
+    ext = filename.rpartition('.')[2].lower()
+    match ext:
+        case 'obj': return write_obj(filename, verts, faces)
+        case 'ply': return write_ply(filename, verts, faces)
+        case 'stl': return write_stl(filename, verts, faces)
+        case _: raise ValueError(f'Unsupported mesh format: {ext}')
+
+
+# Combines several (verts, faces) meshes into one, such as the faces of an outer cube.
+#   Verticies are concatenated, and faces are offset as they are read.
+def concat_meshes(meshes):
+    meshes = list(meshes)
+    verts = np.concatenate([np.asarray(v, dtype=float).reshape(-1, 3)
+                           for v, _ in meshes])
+
+    def offset_faces():
+        offset = 0
+        for v, faces in meshes:
+            for chunk in face_chunks(faces):
+                if isinstance(chunk, np.ndarray):
+                    yield from chunk + offset
+                else:
+                    yield from ([i + offset for i in face] for face in chunk)
+            offset += len(v)
+    return (verts, offset_faces())
+
+
+# Merges verticies closer than `tolerance`, such as the duplicates along the seams of
+#   meshes joined with `concat_meshes()`.  `faces` is a (n, sides) array.  Verticies
+#   keep the order they are first used in; faces that become degenerate or duplicated
+#   are dropped.
+def weld_verts(verts, faces, tolerance=1e-6):
+    verts = np.asarray(verts, dtype=float).reshape(-1, 3)
+    faces = np.asarray(faces)
+    if len(verts) == 0:
+        return (verts, faces)
+    keys = np.round(verts / tolerance).astype(np.int64)
+    _, first, inverse = np.unique(keys, axis=0, return_index=True, return_inverse=True)
+    order = np.argsort(first)
+    remap = np.empty_like(order)
+    remap[order] = np.arange(len(order))
+    verts = verts[first[order]]
+    faces = remap[inverse.reshape(-1)][faces]
+
+    corners = np.sort(faces, axis=1)
+    distinct = np.all(corners[:, 1:] != corners[:, :-1], axis=1)
+    _, unique = np.unique(corners, axis=0, return_index=True)
+    keep = np.zeros(len(faces), dtype=bool)
+    keep[unique] = True
+    return (verts, faces[keep & distinct])
+
+
+# Yields faces in chunks.  Chunks of faces with the same number of verticies are
+#   numpy arrays with shape (n, sides), otherwise they are lists of faces.
+def face_chunks(faces):
+    if isinstance(faces, np.ndarray):
+        for i in range(0, len(faces), chunk_size):
+            yield faces[i:i+chunk_size]
+        return
+    it = iter(faces)
+    while True:
+        chunk = list(islice(it, chunk_size))
+        if len(chunk) == 0:
+            return
+        sides = len(chunk[0])
+        if all(len(f) == sides for f in chunk):
+            yield np.asarray(chunk, dtype=np.int64).reshape(-1, sides)
+        else:
+            yield chunk
+
+
+# Returns the number of faces written
+def write_obj(filename, verts, faces):
+    verts = np.asarray(verts, dtype=float).reshape(-1, 3)
+    count = 0
+    with open(filename, 'w') as f:
+        np.savetxt(f, verts, fmt='v %.6f %.6f %.6f')
+        for chunk in face_chunks(faces):
+            if isinstance(chunk, np.ndarray):
+                np.savetxt(f, chunk + 1, fmt='f' + ' %d' * chunk.shape[1])
+            else:
+                f.writelines(
+                    'f ' + ' '.join(str(i + 1) for i in face) + '\n' for face in chunk)
+            count += len(chunk)
+    return count
+
+
+# Binary little endian PLY with float verticies and int vertex indices.
+#   Returns the number of faces written.
+def write_ply(filename, verts, faces):
+    verts = np.asarray(verts, dtype='<f4').reshape(-1, 3)
+    count = 0
+    with open(filename, 'wb') as f:
+        f.write(ply_header(len(verts), count))
+        f.write(verts.tobytes())
+        for chunk in face_chunks(faces):
+            if isinstance(chunk, np.ndarray):
+                sides = chunk.shape[1]
+                data = np.empty(len(chunk), dtype=[
+                                ('n', 'u1'), ('v', '<i4', (sides,))])
+                data['n'] = sides
+                data['v'] = chunk
+                f.write(data.tobytes())
+            else:
+                f.write(b''.join(struct.pack(
+                    f'<B{len(face)}i', len(face), *face) for face in chunk))
+            count += len(chunk)
+        f.seek(0)
+        f.write(ply_header(len(verts), count))
+    return count
+
+
+# The face count is padded so the header can be rewritten in place
+def ply_header(verts, faces):
+    return (
+        'ply\n'
+        'format binary_little_endian 1.0\n'
+        f'element vertex {verts}\n'
+        'property float x\n'
+        'property float y\n'
+        'property float z\n'
+        f'element face {faces:>10}\n'
+        'property list uchar int vertex_indices\n'
+        'end_header\n'
+    ).encode('ascii')
+
+
+# Binary STL.  Faces are triangulated as fans.  Returns the number of triangles written.
+def write_stl(filename, verts, faces):
+    verts = np.asarray(verts, dtype=float).reshape(-1, 3)
+    record = np.dtype([('normal', '<f4', (3,)), ('v', '<f4', (3, 3)),
+                       ('attr', '<u2')])
+    count = 0
+    with open(filename, 'wb') as f:
+        f.write(b'\0' * 80)
+        f.write(struct.pack('<I', count))
+        for chunk in face_chunks(faces):
+            tris = triangulate(chunk)
+            corners = verts[tris]
+            normals = np.cross(corners[:, 1] - corners[:, 0],
+                               corners[:, 2] - corners[:, 0])
+            lengths = np.linalg.norm(normals, axis=1, keepdims=True)
+            normals = np.divide(normals, lengths, out=np.zeros_like(
+                normals), where=lengths != 0)
+            data = np.zeros(len(tris), dtype=record)
+            data['normal'] = normals
+            data['v'] = corners
+            f.write(data.tobytes())
+            count += len(tris)
+        f.seek(80)
+        f.write(struct.pack('<I', count))
+    return count
+
+
+# Splits a chunk of faces into triangles (n, 3)
+def triangulate(chunk):
+    if isinstance(chunk, np.ndarray):
+        sides = chunk.shape[1]
+        return np.concatenate([chunk[:, [0, i, i+1]] for i in range(1, sides-1)]) if sides > 3 else chunk
+    return np.array([(face[0], face[i], face[i+1]) for face in chunk for i in range(1, len(face)-1)], dtype=np.int64).reshape(-1, 3)
@@ -1,8 +1,56 @@
 from typing import Callable
 
+import numpy as np
+
+# Affine transforms
+#   4x4 matrices acting on column vectors (x, y, z, 1).  Build a matrix for a chain of
+#   steps once with `compose()` and apply it to all of a mesh's verticies with
+#   `transform()`, instead of mapping each step over a list of tuples.
+
+
+# 4x4 matrix from a 3x3 matrix
+def linear(m):
+    a = np.eye(4)
+    a[:3, :3] = m
+    return a
+
+
+def translation(ox, oy, oz):
+    a = np.eye(4)
+    a[:3, 3] = (ox, oy, oz)
+    return a
+
+
+# One matrix that applies `matrices` in order, first to last
+def compose(*matrices):
+    a = np.eye(4)
+    for m in matrices:
+        a = m @ a
+    return a
+
+
+# Applies an affine matrix to a (n, 3) array (or list) of verticies
+def transform(matrix, verts):
+    verts = np.asarray(verts, dtype=float).reshape(-1, 3)
+    return verts @ matrix[:3, :3].T + matrix[:3, 3]
+
+
 # Rotations
 #   https://calcworkshop.com/transformations/rotation-rules/
 # rotations are around the center, (0, 0, 0)
+rotate_xy_ccw_matrix = linear([[0, -1, 0], [1, 0, 0], [0, 0, 1]])
+rotate_xy_cw_matrix = linear([[0, 1, 0], [-1, 0, 0], [0, 0, 1]])
+rotate_xz_ccw_matrix = linear([[0, 0, -1], [0, 1, 0], [1, 0, 0]])
+rotate_xz_cw_matrix = linear([[0, 0, 1], [0, 1, 0], [-1, 0, 0]])
+rotate_yz_ccw_matrix = linear([[1, 0, 0], [0, 0, -1], [0, 1, 0]])
+rotate_yz_cw_matrix = linear([[1, 0, 0], [0, 0, 1], [0, -1, 0]])
+mirror_x_matrix = linear(np.diag([-1, 1, 1]))
+mirror_y_matrix = linear(np.diag([1, -1, 1]))
+mirror_z_matrix = linear(np.diag([1, 1, -1]))
+# 180° rotations
+flip_xy_matrix = linear([[0, -1, 0], [-1, 0, 0], [0, 0, 1]])
+flip_xz_matrix = linear([[0, 0, -1], [0, 1, 0], [-1, 0, 0]])
+flip_yz_matrix = linear([[1, 0, 0], [0, 0, -1], [0, -1, 0]])
 
 
 def rotate_xy_ccw(p: tuple):
@@ -55,6 +103,21 @@ def point_offset(p: tuple, ox, oy, oz):
     return (x+ox, y+oy, z+oz)
 
 
+# 3x3 matrix for a rotation of `angle` radians around `axis` (same as mathutils.Matrix.Rotation).
+#   With an array of angles, returns a stack of matrices with shape angle.shape + (3, 3).
+def rotation_matrix(angle, axis):
+    x, y, z = np.asarray(axis, dtype=float) / np.linalg.norm(axis)
+    c = np.cos(angle)
+    s = np.sin(angle)
+    t = 1 - c
+    m = np.array([
+        [t*x*x + c, t*x*y - s*z, t*x*z + s*y],
+        [t*x*y + s*z, t*y*y + c, t*y*z - s*x],
+        [t*x*z - s*y, t*y*z + s*x, t*z*z + c],
+    ])
+    return np.moveaxis(m, (0, 1), (-2, -1))
+
+
 # 180° rotation around xy
 def flip_xy(p: tuple):
     x, y, z = p
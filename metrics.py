@@ -0,0 +1,81 @@
+import numpy as np
+
+from meshes.maze2d import ABOVE
+from meshes.grid_edges import neighbor_table, direction_bits, is_stacked
+
+# Maze statistics computed from `grid.link_bits` with array operations.
+#
+# `maze_metrics()` returns a dict with:
+#   cells           number of cells
+#   links           number of passages between cells
+#   degrees         number of cells with 0, 1, 2, ... passages
+#   dead_ends       cells with one passage
+#   junctions       cells with three or more passages
+#   river_factor    fraction of cells with exactly two passages, which is higher for
+#                   mazes with long winding corridors and few branches
+#   corridors       number of corridors of each length: corridors[n] is the number of
+#                   corridors n cells long.  A corridor is a chain of linked cells with
+#                   exactly two passages each, running between cells that aren't part
+#                   of a corridor (dead ends and junctions), so it can turn corners and
+#                   follow passages that wrap around the grid.  corridors[0] is always 0.
+#   vertical_links  passages from each level to the level above (stacked cubes only)
+
+
+def maze_metrics(grid):
+    table = neighbor_table(grid)
+    bits = np.frombuffer(grid.link_bits, dtype=np.uint8)
+    linked = (table >= 0) & (bits[:, np.newaxis] & direction_bits != 0)
+    # a neighbor that is in two directions (such as in narrow cylinders) is one passage
+    for j in range(1, table.shape[1]):
+        linked[:, j] &= (table[:, :j] != table[:, j:j+1]).all(axis=1)
+    degree = linked.sum(axis=1)
+    levels = getattr(grid, 'levels', 1)
+    layout = bits.reshape(levels, grid.rows, grid.cols)
+    report = {
+        'cells': grid.cap,
+        'links': int(degree.sum()) // 2,
+        'degrees': np.bincount(degree).tolist(),
+        'dead_ends': int(np.count_nonzero(degree == 1)),
+        'junctions': int(np.count_nonzero(degree >= 3)),
+        'river_factor': float(np.count_nonzero(degree == 2)) / grid.cap,
+        'corridors': corridor_lengths(table, linked, degree).tolist(),
+        'vertical_links': [],
+    }
+    if is_stacked(grid):
+        report['vertical_links'] = np.count_nonzero(
+            layout[:-1] & ABOVE, axis=(1, 2)).tolist()
+    return report
+
+
+# Histogram of corridor lengths (see above) from the neighbor table, which neighbors are
+#   linked, and each cell's number of passages
+def corridor_lengths(table, linked, degree):
+    inside = degree == 2
+    a = np.nonzero(linked)[0]
+    b = table[linked]
+    keep = inside[a] & inside[b] & (a < b)
+    cells = np.flatnonzero(inside)
+    if len(cells) == 0:
+        return np.zeros(0, dtype=np.int64)
+    labels = chain_labels(len(table), a[keep], b[keep])
+    sizes = np.unique(labels[cells], return_counts=True)[1]
+    return np.bincount(sizes)
+
+
+# Labels each cell with the smallest id in its connected component of the graph with
+#   edges (a, b), by hooking components onto smaller labels and pointer jumping
+def chain_labels(size, a, b):
+    labels = np.arange(size)
+    while True:
+        la = labels[a]
+        lb = labels[b]
+        if np.array_equal(la, lb):
+            return labels
+        low = np.minimum(la, lb)
+        np.minimum.at(labels, la, low)
+        np.minimum.at(labels, lb, low)
+        while True:
+            jumped = labels[labels]
+            if np.array_equal(jumped, labels):
+                break
+            labels = jumped
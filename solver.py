@@ -0,0 +1,122 @@
+import heapq
+from collections import deque
+
+import numpy as np
+
+from meshes.grid_edges import neighbor_table, direction_bits
+
+# Distances, solutions and longest paths through a generated maze.
+#
+# Cells are ids.  `weights` is a sequence with the cost of entering each cell, and
+#   defaults to the grid's cell weights (`grid.weights`, or `grid.weight` for every cell
+#   if no cell's weight was changed).  When every cell costs the same, distances count
+#   steps and are found with a breadth first search; if the costs differ, Dijkstra's
+#   algorithm is used instead.
+
+
+# The maze's passages as flat arrays: the cells linked to cell c are
+#   targets[offsets[c]:offsets[c+1]]
+def link_graph(grid):
+    table = neighbor_table(grid)
+    bits = np.frombuffer(grid.link_bits, dtype=np.uint8)
+    linked = (table >= 0) & (bits[:, np.newaxis] & direction_bits != 0)
+    offsets = np.zeros(grid.cap + 1, dtype=np.int64)
+    np.cumsum(linked.sum(axis=1), out=offsets[1:])
+    return (offsets.tolist(), table[linked].tolist())
+
+
+# Returns (distance, parent) arrays for every cell from `start`.  Cells that can't be
+#   reached have a distance and parent of -1, and the start cell's parent is -1.
+def distances(grid, start, weights=None, graph=None):
+    if graph == None:
+        graph = link_graph(grid)
+    if weights is None:
+        weights = getattr(grid, 'weights', None)
+    if weights is not None and len(set(weights)) > 1:
+        return dijkstra(grid.cap, graph, start, weights)
+    if weights is None or len(weights) == 0:
+        scale = getattr(grid, 'weight', 1)
+    else:
+        scale = weights[0]
+    offsets, targets = graph
+    dist = [-1] * grid.cap
+    parent = [-1] * grid.cap
+    dist[start] = 0
+    queue = deque([start])
+    while queue:
+        cell = queue.popleft()
+        d = dist[cell] + 1
+        for i in range(offsets[cell], offsets[cell + 1]):
+            n = targets[i]
+            if dist[n] < 0:
+                dist[n] = d
+                parent[n] = cell
+                queue.append(n)
+    dist = np.array(dist, dtype=np.int64)
+    if scale != 1:
+        dist = np.where(dist >= 0, dist * scale, -1)
+    return (dist, np.array(parent, dtype=np.int64))
+
+
+def dijkstra(cap, graph, start, weights):
+    offsets, targets = graph
+    inf = float('inf')
+    dist = [inf] * cap
+    parent = [-1] * cap
+    dist[start] = 0
+    heap = [(0, start)]
+    while heap:
+        d, cell = heapq.heappop(heap)
+        if d > dist[cell]:
+            continue
+        for i in range(offsets[cell], offsets[cell + 1]):
+            n = targets[i]
+            nd = d + weights[n]
+            if nd < dist[n]:
+                dist[n] = nd
+                parent[n] = cell
+                heapq.heappush(heap, (nd, n))
+    dist = np.array(dist, dtype=float)
+    dist[np.isinf(dist)] = -1
+    return (dist, np.array(parent, dtype=np.int64))
+
+
+# Cells from the start of a `distances()` search to `goal`, or an empty list if the
+#   goal can't be reached
+def path_to(parent, start, goal):
+    path = [goal]
+    while path[-1] != start:
+        cell = parent[path[-1]]
+        if cell < 0:
+            return []
+        path.append(int(cell))
+    path.reverse()
+    return path
+
+
+# Returns the cells on the way from `start` to `goal`
+def solve(grid, start, goal, weights=None):
+    dist, parent = distances(grid, start, weights)
+    return path_to(parent, start, goal)
+
+
+# Returns the two cells furthest apart and the distance between them, found with two
+#   searches: the furthest cell from `start`, then the furthest cell from that one.
+#   This is exact for perfect mazes, which are trees.
+def farthest_pair(grid, weights=None, start=0):
+    a, b, dist, parent = double_sweep(grid, weights, start)
+    return (a, b, dist[b].item())
+
+
+# The cells along the longest path through the maze, such as for picking its start and exit
+def longest_path(grid, weights=None, start=0):
+    a, b, dist, parent = double_sweep(grid, weights, start)
+    return path_to(parent, a, b)
+
+
+def double_sweep(grid, weights, start):
+    graph = link_graph(grid)
+    dist, parent = distances(grid, start, weights, graph)
+    a = int(np.argmax(dist))
+    dist, parent = distances(grid, a, weights, graph)
+    return (a, int(np.argmax(dist)), dist, parent)
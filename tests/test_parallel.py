@@ -0,0 +1,34 @@
+import numpy as np
+
+import algos
+import batch
+from meshes.cube import Cube
+
+# Mazes are seeded per level and per spec, so worker processes must not change the output
+
+
+def test_growing_tree_3d_workers():
+    serial = Cube(8, 8, 5, rng=11)
+    algos.growing_tree_3d(serial, workers=0)
+    parallel = Cube(8, 8, 5, rng=11)
+    algos.growing_tree_3d(parallel, workers=2)
+    assert bytes(serial.link_bits) == bytes(parallel.link_bits)
+
+
+def test_generate_batch_workers():
+    specs = [
+        {'type': 'cube', 'rows': 4, 'cols': 5, 'levels': 3, 'metrics': True},
+        {'type': 'outer_cube', 'rows': 3, 'cols': 3, 'algorithm': 'newest'},
+        {'type': 'mobius', 'rows': 20, 'cols': 4, 'algorithm': 'mixed', 'ratio': 0.3},
+        {'type': 'cube', 'seed': 99, 'inset': 0},
+    ]
+    serial = batch.generate_batch(specs, workers=0)
+    parallel = batch.generate_batch(specs, workers=2)
+    assert len(serial) == len(parallel) == len(specs)
+    for a, b in zip(serial, parallel):
+        assert a.keys() == b.keys()
+        for key in a:
+            if isinstance(a[key], np.ndarray):
+                assert np.array_equal(a[key], b[key])
+            else:
+                assert a[key] == b[key]
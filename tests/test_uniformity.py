@@ -0,0 +1,29 @@
+import algos
+from meshes.maze2d import RectGrid
+
+# A 2x3 grid has 15 spanning trees.  Uniform generators should pick each of them about
+#   equally often: the chi-square statistic over the 15 mazes has 14 degrees of freedom,
+#   with a 1% critical value of 29.14.
+samples = 60_000
+trees = 15
+critical = 29.14
+
+
+def chi_square(generate):
+    counts = {}
+    for seed in range(samples):
+        grid = RectGrid(2, 3, rng=seed)
+        generate(grid)
+        key = bytes(grid.link_bits)
+        counts[key] = counts.get(key, 0) + 1
+    assert len(counts) == trees
+    expected = samples / trees
+    return sum((n - expected) ** 2 / expected for n in counts.values())
+
+
+def test_wilson_is_uniform():
+    assert chi_square(algos.wilson) < critical
+
+
+def test_aldous_broder_is_uniform():
+    assert chi_square(algos.aldous_broder) < critical